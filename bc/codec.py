@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""Instruction codewords split into operand sequences and joined back, with numpy when it is installed"""
+from array import array
+
+from bc.data import INSTRUCTIONS, InsType, LAYOUT_ABC, CONSTANT_OPERAND_TYPES
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+OPERAND_RAW = 0
+OPERAND_CONST = 1  # negated index into constant table
+OPERAND_JMP = 2  # biased with 0x8000
+OPERAND_SLIT = 3  # 16 bit signed
+
+
+def _operand_kind(op_type):
+    if op_type in CONSTANT_OPERAND_TYPES:
+        return OPERAND_CONST
+    if op_type == InsType.JMP:
+        return OPERAND_JMP
+    if op_type == InsType.SLIT:
+        return OPERAND_SLIT
+    return OPERAND_RAW
+
+
+def _build_decode_tables():
+    cd_kinds = [OPERAND_RAW] * 256
+    has_abc = [False] * 256
+    for opcode, instruction_class in INSTRUCTIONS.items():
+        # only the CD operand is ever a constant, jump or signed literal
+        assert _operand_kind(instruction_class.A_TYPE) == OPERAND_RAW
+        assert _operand_kind(instruction_class.B_TYPE) == OPERAND_RAW
+        has_abc[opcode] = instruction_class.LAYOUT == LAYOUT_ABC
+        cd_kinds[opcode] = _operand_kind(instruction_class.CD_TYPE)
+    return cd_kinds, has_abc
+
+
+CD_KINDS, HAS_ABC = _build_decode_tables()
+NUMPY_MIN_INSTRUCTIONS = 128  # numpy call overhead outweighs the gain on small prototypes
+if numpy is not None:
+    NUMPY_CD_KINDS = numpy.array(CD_KINDS, dtype=numpy.int8)
+    NUMPY_HAS_ABC = numpy.array(HAS_ABC, dtype=numpy.bool_)
+
+
+def split_codewords(codewords, const_base):
+    """
+    Split native order 32 bit codewords (B:8 C:8 A:8 OP:8 or D:16 A:8 OP:8) into opcode, A, B and CD lists.
+    CD is C or D depending on the opcode, with constant indices, jumps and signed literals already decoded.
+    """
+    if numpy is not None and len(codewords) >= NUMPY_MIN_INSTRUCTIONS:
+        words = numpy.frombuffer(codewords, dtype=numpy.uint32)
+        opcodes = words & 0xFF
+        kinds = NUMPY_CD_KINDS[opcodes]
+        cd = numpy.where(NUMPY_HAS_ABC[opcodes], (words >> 16) & 0xFF, words >> 16).astype(numpy.int64)
+        cd = numpy.where(kinds == OPERAND_CONST, const_base - cd, cd)
+        cd = numpy.where(kinds == OPERAND_JMP, cd - 0x8000, cd)
+        cd = numpy.where((kinds == OPERAND_SLIT) & (cd >= 0x8000), cd - 0x10000, cd)
+        return opcodes.tolist(), ((words >> 8) & 0xFF).tolist(), (words >> 24).tolist(), cd.tolist()
+
+    opcodes = [w & 0xFF for w in codewords]
+    cd_operands = []
+    append = cd_operands.append
+    for opcode, w in zip(opcodes, codewords):
+        if HAS_ABC[opcode]:
+            cd = (w >> 16) & 0xFF
+        else:
+            cd = w >> 16
+        kind = CD_KINDS[opcode]
+        if kind == OPERAND_CONST:
+            cd = const_base - cd
+        elif kind == OPERAND_JMP:
+            cd -= 0x8000
+        elif kind == OPERAND_SLIT and cd & 0x8000:
+            cd -= 0x10000
+        append(cd)
+    return opcodes, [(w >> 8) & 0xFF for w in codewords], [w >> 24 for w in codewords], cd_operands
+
+
+def join_codewords(opcodes, a_operands, b_operands, cd_operands, const_base) -> array:
+    """Inverse of split_codewords, encodes decoded operand sequences into native order 32 bit codewords"""
+    if numpy is not None and len(opcodes) >= NUMPY_MIN_INSTRUCTIONS:
+        opcodes = numpy.asarray(opcodes, dtype=numpy.int64)
+        kinds = NUMPY_CD_KINDS[opcodes]
+        cd = numpy.asarray(cd_operands, dtype=numpy.int64)
+        cd = numpy.where(kinds == OPERAND_CONST, const_base - cd, cd)
+        cd = numpy.where(kinds == OPERAND_JMP, cd + 0x8000, cd) & 0xFFFF
+        b = numpy.where(NUMPY_HAS_ABC[opcodes], numpy.asarray(b_operands, dtype=numpy.int64), 0)
+        words = opcodes | numpy.asarray(a_operands, dtype=numpy.int64) << 8 | cd << 16 | b << 24
+        codewords = array('I')
+        codewords.frombytes(words.astype(numpy.uint32).tobytes())
+        return codewords
+
+    words = []
+    append = words.append
+    for opcode, a, b, cd in zip(opcodes, a_operands, b_operands, cd_operands):
+        kind = CD_KINDS[opcode]
+        if kind == OPERAND_CONST:
+            cd = const_base - cd
+        elif kind == OPERAND_JMP:
+            cd += 0x8000
+        elif kind == OPERAND_SLIT:
+            cd &= 0xFFFF
+        if HAS_ABC[opcode]:
+            append(opcode | a << 8 | cd << 16 | b << 24)
+        else:
+            append(opcode | a << 8 | cd << 16)
+    return array('I', words)
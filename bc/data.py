@@ -1,6 +1,8 @@
 #!/usr/bin/env python
 # coding: utf-8
-from typing import List, Dict, Type
+from array import array
+from operator import attrgetter
+from typing import List, Dict, Type, Union, Iterable
 
 
 class Const(object):
@@ -51,7 +53,14 @@ class Const(object):
     ]
 
 
+def fields(obj) -> dict:
+    """Field values of a data object in declaration order, the keyword arguments to construct it again"""
+    return {name: getattr(obj, name) for name in obj.FIELDS}
+
+
 class BytecodeDump(object):
+    __slots__ = FIELDS = ('number', 'origin', 'name', 'is_stripped', 'is_big_endian', 'has_ffi', 'version', 'prototypes')
+
     def __init__(self, **kwargs):
         self.number = 0
         self.origin = ''
@@ -66,8 +75,33 @@ class BytecodeDump(object):
         for key, value in kwargs.items():
             setattr(self, key, value)
 
+    def layout(self) -> tuple:
+        """The flags which change how prototype bodies are encoded: byte order and strip flag"""
+        return bool(self.is_big_endian), bool(self.is_stripped)
+
+    def sorted_prototypes(self) -> List['Prototype']:
+        """Every prototype in the order of the dump format, children before their parent in reverse constant table order"""
+        prototypes = []
+
+        def add_prototypes(pt: Prototype):
+            for child in reversed(pt.child_prototypes()):
+                add_prototypes(child)
+            prototypes.append(pt)
+
+        for prototype in self.prototypes:
+            add_prototypes(prototype)
+        return prototypes
+
 
 class Prototype(object):
+    FIELDS = ('number', 'has_sub_prototypes', 'is_variadic', 'has_ffi', 'is_jit_disabled', 'has_iloop',
+              'upvalue_count', 'constant_count', 'numeric_count', 'instruction_count', 'debug_info_size', 'argument_count', 'frame_size',
+              'first_line_number', 'line_count', 'instructions', 'upvalues', 'numerics', 'constants', 'debug_info')
+    HEADER, BODY = FIELDS[:-5], FIELDS[-5:]
+    LISTS = BODY[:-1]  # stored as TrackedList, TrackedArray or InstructionArray, see body_state()
+    __slots__ = HEADER + ('debug_info', '_instructions', '_upvalues', '_numerics', '_constants', 'edits',
+                          'raw', 'raw_state', 'constant_map', 'constant_map_key', 'reference_map', 'reference_map_key')
+
     def __init__(self, **kwargs):
         self.number = 0
         self.has_sub_prototypes = False
@@ -86,23 +120,154 @@ class Prototype(object):
         self.first_line_number = 0
         self.line_count = 0
         self.instructions: List[Instruction] = []
-        self.upvalues = []
+        self.upvalues = array('H')  # upvalue references, 16 bit each
         self.numerics = []
         self.constants: List[ConstRef] = []
         self.debug_info: DebugInfo = None
+        self.edits = 0  # in place changes of the instructions and constants it tracks, see track()
+        self.raw: bytes = None  # encoded body as read, see Reader(keep_raw=True)
+        self.raw_state: tuple = None  # dump layout, header values and body list versions when raw was read, see is_dirty
+        self.constant_map: Dict[ConstRef, int] = None  # constant -> index, keyed by identity
+        self.constant_map_key = None  # constants list and its change count when the map was built
+        self.reference_map: Dict[int, List[int]] = None  # constant index -> pcs of instructions referring to it
+        self.reference_map_key = None  # instructions, their change count and edits when the map was built
         for key, value in kwargs.items():
             setattr(self, key, value)
         for ins in self.instructions:
             ins.process_operand(self)
 
+    def child_prototypes(self) -> List['Prototype']:
+        """Child prototypes in constant table order"""
+        return [c.ref for c in self.constants if isinstance(c.ref, Prototype)]
+
+    def mark_dirty(self):
+        """
+        Drop the raw body after changing the prototype in place, so the writer encodes it again instead of copying it.
+        Assigned fields, changes to the instruction, upvalue, numeric and constant lists and operand or constant
+        assignments are noticed without it, changes inside tables and debug info are not.
+        Also drops the constant lookup maps
+        """
+        self.raw = None
+        self.raw_state = None
+        self.constant_map = None
+        self.reference_map = None
+
+    def set_raw(self, raw: bytes, layout: tuple, body_read=True):
+        """
+        Keep the body as read, it is written back as is until the prototype changes, see is_dirty.
+        layout is BytecodeDump.layout() of the dump it was read from
+        """
+        if body_read:
+            self.track()
+        self.raw = raw
+        self.raw_state = layout, self.header_state(), self.body_state() if body_read else None
+
+    def track(self):
+        """Count operand and constant assignments of the current instructions and constants in edits"""
+        if not isinstance(self.instructions, InstructionArray):
+            for ins in self.instructions:
+                _set_instruction_owner(ins, self)
+        for const in self.constants:
+            _set_constant_owner(const, self)
+
+    def raw_fits(self, layout: tuple) -> bool:
+        """Whether the raw body can be copied into a dump with this BytecodeDump.layout()"""
+        return not self.is_dirty and self.raw_state[0] == layout
+
+    def header_state(self) -> tuple:
+        return _header_values(self)
+
+    def body_state(self) -> tuple:
+        """
+        Each body list with its change count, the in place edits and the debug info. Constant time, the lists count
+        their own changes. A list replaced by an equal one compares equal
+        """
+        instructions, upvalues, numerics, constants = self.instructions, self.upvalues, self.numerics, self.constants
+        return (instructions, instructions.version, upvalues, upvalues.version, numerics, numerics.version,
+                constants, constants.version, self.edits, self.debug_info)
+
+    def constant_index(self, const: 'ConstRef') -> int:
+        """Index of const in the constant table, same as constants.index(const) in constant time"""
+        constants = self.constants
+        key = self.constant_map_key
+        if self.constant_map is None or key[0] is not constants or key[1] != constants.version:
+            self._map_constants()
+        index = self.constant_map.get(const)
+        if index is None or constants[index] is not const:
+            # changed behind the change count, e.g. through list.__setitem__
+            self._map_constants()
+            index = self.constant_map.get(const)
+        if index is None:
+            raise ValueError('{!r} is not a constant of prototype {}'.format(const, self.number))
+        return index
+
+    def _map_constants(self):
+        constants = self.constants
+        self.constant_map = {}
+        for index, c in enumerate(constants):
+            self.constant_map.setdefault(c, index)
+        self.constant_map_key = constants, constants.version
+
+    def constant_references(self, const: 'ConstRef') -> List[int]:
+        """Program counters of the instructions with const as an operand"""
+        index = self.constant_index(const)
+        instructions = self.instructions
+        key = self.reference_map_key
+        if self.reference_map is None or key[0] is not instructions or key[1] != instructions.version or key[2] != self.edits:
+            self.track()
+            self.reference_map = {}
+            if isinstance(instructions, InstructionArray):
+                operands = ((INSTRUCTIONS[opcode].CD_TYPE, cd) for opcode, cd in zip(instructions.opcodes, instructions.cd))
+            else:
+                operands = ((ins.CD_TYPE, getattr(ins, 'cd', None)) for ins in instructions)
+            for pc, (operand_type, cd) in enumerate(operands):
+                # only the CD operand is ever a constant
+                if operand_type in CONSTANT_OPERAND_TYPES:
+                    self.reference_map.setdefault(cd, []).append(pc)
+            self.reference_map_key = instructions, instructions.version, self.edits
+        return self.reference_map.get(index, [])
+
+    @property
+    def is_dirty(self):
+        """True if the prototype has to be encoded again, because it has no raw body or changed since it was read"""
+        if self.raw is None:
+            return True
+        _, header, body = self.raw_state
+        # a lazy prototype whose body was never loaded only has its header to compare
+        return header != self.header_state() or body is not None and body != self.body_state()
+
+
+def instruction_operands(instructions) -> tuple:
+    """Opcode, a, b and cd sequences of an instruction list or InstructionArray, unused operands are 0"""
+    if isinstance(instructions, InstructionArray):
+        return instructions.opcodes, instructions.a, instructions.b, instructions.cd
+    return ([ins.OPCODE for ins in instructions], [getattr(ins, 'a', 0) for ins in instructions],
+            [getattr(ins, 'b', 0) for ins in instructions], [getattr(ins, 'cd', 0) for ins in instructions])
+
+
+def _count_edit(obj, name, value):
+    # __setattr__ of instructions and constants, counted in the edits of the prototype tracking them
+    object.__setattr__(obj, name, value)
+    owner = getattr(obj, 'owner', None)
+    if owner is not None:
+        owner.edits += 1
+
 
 class ConstRef(object):
+    FIELDS = ('number', 'ref')
+    __slots__ = FIELDS + ('owner',)  # owner: prototype counting the edits, see Prototype.track()
+
     def __init__(self, ref, number=None):
-        self.number = number
-        self.ref = ref
+        # not counted as edits, the reader creates every constant through here
+        object.__setattr__(self, 'number', number)
+        object.__setattr__(self, 'ref', ref)
+
+    __setattr__ = _count_edit
 
 
 class Table(object):
+    __slots__ = FIELDS = ('array', 'dictionary')
+
     def __init__(self, **kwargs):
         self.array = []
         self.dictionary = []
@@ -111,15 +276,21 @@ class Table(object):
 
 
 class DebugInfo(object):
+    __slots__ = FIELDS = ('addr_to_line_map', 'upvalue_variable_names', 'variable_infos')
+
     def __init__(self, **kwargs):
-        self.addr_to_line_map = []
+        self.addr_to_line_map = array('I')
         self.upvalue_variable_names = []
         self.variable_infos: List[VariableInfo] = []
         for key, value in kwargs.items():
             setattr(self, key, value)
+        if isinstance(self.addr_to_line_map, list):
+            self.addr_to_line_map = array('I', self.addr_to_line_map)
 
 
 class VariableInfo(object):
+    __slots__ = FIELDS = ('start_addr', 'end_addr', 'type', 'name')
+
     T_VISIBLE = 0
     T_INTERNAL = 1
 
@@ -133,6 +304,8 @@ class VariableInfo(object):
 
 
 class Instruction(object):
+    __slots__ = ('owner', '__dict__')  # owner: prototype counting the edits, see Prototype.track()
+
     NAME = None
     OPCODE = None
     A_TYPE = None
@@ -148,13 +321,15 @@ class Instruction(object):
         if self.CD_TYPE is not None:
             self.cd = operands.pop(0) if operands else kwargs.pop('cd', 0)
 
+    __setattr__ = _count_edit
+
     def process_operand(self, prototype: Prototype):
         if hasattr(self, 'a') and isinstance(self.a, ConstRef):
-            self.a = prototype.constants.index(self.a)
+            self.a = prototype.constant_index(self.a)
         if hasattr(self, 'b') and isinstance(self.b, ConstRef):
-            self.b = prototype.constants.index(self.b)
+            self.b = prototype.constant_index(self.b)
         if hasattr(self, 'cd') and isinstance(self.cd, ConstRef):
-            self.cd = prototype.constants.index(self.cd)
+            self.cd = prototype.constant_index(self.cd)
 
     def __str__(self):
         arguments = []
@@ -171,6 +346,13 @@ class Instruction(object):
 
 
 INSTRUCTIONS: Dict[int, Type] = {}
+INSTRUCTION_LAYOUTS: Dict[int, tuple] = {}  # opcode -> (instruction class, operand layout), the decode table of make_instruction()
+
+# operand layouts, which of a, b and cd an instruction has
+LAYOUT_ABC = 0
+LAYOUT_AD = 1
+LAYOUT_A = 2
+LAYOUT_D = 3
 
 
 def _define_instruction(name, a_type, b_type, cd_type) -> Type:
@@ -183,10 +365,145 @@ def _define_instruction(name, a_type, b_type, cd_type) -> Type:
     new_class.A_TYPE = a_type
     new_class.B_TYPE = b_type
     new_class.CD_TYPE = cd_type
+    if b_type is not None:
+        new_class.LAYOUT = LAYOUT_ABC
+    elif cd_type is None:
+        new_class.LAYOUT = LAYOUT_A
+    elif a_type is None:
+        new_class.LAYOUT = LAYOUT_D
+    else:
+        new_class.LAYOUT = LAYOUT_AD
     INSTRUCTIONS[new_class.OPCODE] = new_class
+    INSTRUCTION_LAYOUTS[new_class.OPCODE] = (new_class, new_class.LAYOUT)
     return new_class
 
 
+_new = object.__new__
+_set_operands = Instruction.__dict__['__dict__'].__set__  # not counted as an edit
+_set_instruction_owner = Instruction.owner.__set__
+_set_constant_owner = ConstRef.owner.__set__
+
+
+def make_instruction(opcode, a, b, cd) -> Instruction:
+    """
+    Create an instruction from decoded operands without going through __init__, unused operands are ignored.
+    The single place where operand layouts are decoded, the reader calls it for every instruction
+    """
+    instruction_class, layout = INSTRUCTION_LAYOUTS[opcode]
+    ins = _new(instruction_class)
+    if layout == LAYOUT_AD:
+        _set_operands(ins, {'a': a, 'cd': cd})
+    elif layout == LAYOUT_ABC:
+        _set_operands(ins, {'a': a, 'b': b, 'cd': cd})
+    elif layout == LAYOUT_A:
+        _set_operands(ins, {'a': a})
+    else:
+        _set_operands(ins, {'cd': cd})
+    return ins
+
+
+class InstructionArray(object):
+    """
+    Compact instruction list, opcode and operands are stored in parallel typed arrays.
+    Indexing and iteration create short lived Instruction objects, changes to them are not stored back.
+    Scans over the whole prototype can use the opcodes, a, b and cd arrays directly, the arrays count the changes
+    made to them.
+    """
+
+    def __init__(self, instructions: Iterable[Instruction] = ()):
+        self.opcodes = TrackedArray('B')
+        self.a = TrackedArray('B')
+        self.b = TrackedArray('B')
+        self.cd = TrackedArray('i')
+        self.extend(instructions)
+
+    @property
+    def version(self) -> int:
+        """Calls that changed the operand arrays"""
+        return self.opcodes.version + self.a.version + self.b.version + self.cd.version
+
+    def append(self, ins: Instruction):
+        self.opcodes.append(ins.OPCODE)
+        self.a.append(getattr(ins, 'a', 0))
+        self.b.append(getattr(ins, 'b', 0))
+        self.cd.append(getattr(ins, 'cd', 0))
+
+    def extend(self, instructions: Iterable[Instruction]):
+        for ins in instructions:
+            self.append(ins)
+
+    def extend_operands(self, opcodes, a, b, cd):
+        """Append already decoded operand sequences of equal length"""
+        self.opcodes.extend(opcodes)
+        self.a.extend(a)
+        self.b.extend(b)
+        self.cd.extend(cd)
+
+    def __len__(self):
+        return len(self.opcodes)
+
+    def __getitem__(self, index) -> Union[Instruction, List[Instruction]]:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return make_instruction(self.opcodes[index], self.a[index], self.b[index], self.cd[index])
+
+    def __setitem__(self, index, ins: Instruction):
+        self.opcodes[index] = ins.OPCODE
+        self.a[index] = getattr(ins, 'a', 0)
+        self.b[index] = getattr(ins, 'b', 0)
+        self.cd[index] = getattr(ins, 'cd', 0)
+
+    def __iter__(self):
+        return map(make_instruction, self.opcodes, self.a, self.b, self.cd)
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+def _count_changes(method):
+    def change(self, *args, **kwargs):
+        self.version += 1
+        return method(self, *args, **kwargs)
+
+    change.__name__ = method.__name__
+    return change
+
+
+class TrackedList(list):
+    """List which counts the calls that change it, for the body lists of a prototype"""
+    version = 0
+
+
+class TrackedArray(array):
+    """Typed array which counts the calls that change it, for the upvalues of a prototype"""
+    version = 0
+
+
+for _name in ('__setitem__', '__delitem__', '__iadd__', '__imul__', 'append', 'extend', 'insert', 'pop', 'remove', 'reverse'):
+    setattr(TrackedList, _name, _count_changes(getattr(list, _name)))
+    setattr(TrackedArray, _name, _count_changes(getattr(array, _name)))
+for _name in ('clear', 'sort'):
+    setattr(TrackedList, _name, _count_changes(getattr(list, _name)))
+for _name in ('byteswap', 'frombytes', 'fromlist'):
+    setattr(TrackedArray, _name, _count_changes(getattr(array, _name)))
+
+
+def _list_property(name, track):
+    slot = getattr(Prototype, '_' + name)
+
+    def set_list(prototype: Prototype, values):
+        slot.__set__(prototype, values if values is None or hasattr(values, 'version') else track(values))
+
+    return property(slot.__get__, set_list, slot.__delete__)
+
+
+_header_values = attrgetter(*Prototype.HEADER)
+Prototype.instructions = _list_property('instructions', TrackedList)
+Prototype.upvalues = _list_property('upvalues', lambda values: TrackedArray('H', values))
+Prototype.numerics = _list_property('numerics', TrackedList)
+Prototype.constants = _list_property('constants', TrackedList)
+
+
 class InsType(object):
     VAR = 1  # variable slot number
     DST = 2  # variable slot number, used as a destination
@@ -204,6 +521,9 @@ class InsType(object):
     JMP = 14  # branch target, relative to next instruction, biased with 0x8000
 
 
+CONSTANT_OPERAND_TYPES = (InsType.STR, InsType.TAB, InsType.FUN, InsType.CDT)  # operands indexing prototype.constants
+
+
 class Ins(object):
     # Comparison ops
     ISLT = _define_instruction("ISLT", InsType.VAR, None, InsType.VAR)
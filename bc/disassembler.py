@@ -0,0 +1,104 @@
+from bc.data import BytecodeDump, Prototype, Table, InsType, InstructionArray, INSTRUCTIONS, CONSTANT_OPERAND_TYPES, \
+    LAYOUT_ABC, LAYOUT_AD, LAYOUT_A
+
+PRIMITIVES = ('nil', 'false', 'true')
+MAX_STRING_LENGTH = 40
+
+# per opcode: line template for pc, line, a, b, cd and the operand types which get a comment
+_TEMPLATES = {
+    LAYOUT_ABC: '%04d %7s {:<6} %4d %4d %4d',
+    LAYOUT_AD: '%04d %7s {:<6} %4d %4d',
+    LAYOUT_A: '%04d %7s {:<6} %4d',
+}
+_FORMATS = {}
+for _opcode, _instruction_class in INSTRUCTIONS.items():
+    _layout = _instruction_class.LAYOUT
+    if _instruction_class.CD_TYPE == InsType.JMP:
+        _template = _TEMPLATES[LAYOUT_A]  # the jump target is appended
+    else:
+        _template = _TEMPLATES.get(_layout, '%04d %7s {:<6} %4d')
+    _FORMATS[_opcode] = (_template.format(_instruction_class.NAME), _layout,
+                         _instruction_class.A_TYPE if _instruction_class.A_TYPE == InsType.UV else None, _instruction_class.CD_TYPE)
+
+
+class Disassembler(object):
+    """
+    Plain text listing in the style of luajit -bl, one block per prototype, children before their parent.
+    Each line holds the pc, the source line, the opcode and its operands, followed by the resolved constants,
+    numerics, primitives and upvalue names. Lines are written per prototype, nothing else is kept.
+    """
+
+    def __init__(self, out, name=''):
+        self.out = out
+        self.name = name  # chunk name shown in the prototype headers
+
+    def write_dump(self, dump: BytecodeDump):
+        self.name = dump.name
+        for prototype in dump.sorted_prototypes():
+            self.write_prototype(prototype)
+
+    def write_prototype(self, prototype: Prototype):
+        lines = ['-- BYTECODE -- {}:{}-{}'.format(self.name, prototype.first_line_number, prototype.first_line_number + prototype.line_count)]
+        append = lines.append
+        debug_info = prototype.debug_info
+        line_map = debug_info.addr_to_line_map if debug_info else None
+        upvalue_names = debug_info.upvalue_variable_names if debug_info else None
+
+        instructions = prototype.instructions
+        if isinstance(instructions, InstructionArray):
+            opcodes, a_operands, b_operands, cd_operands = instructions.opcodes, instructions.a, instructions.b, instructions.cd
+        else:
+            opcodes = [ins.OPCODE for ins in instructions]
+            a_operands = [getattr(ins, 'a', 0) for ins in instructions]
+            b_operands = [getattr(ins, 'b', 0) for ins in instructions]
+            cd_operands = [getattr(ins, 'cd', 0) for ins in instructions]
+
+        # the FUNCF/FUNCV head at pc 0 is implied by the prototype
+        for pc in range(1, len(opcodes)):
+            template, layout, a_type, cd_type = _FORMATS[opcodes[pc]]
+            line_number = '[%d]' % line_map[pc] if line_map else ''
+            a, cd = a_operands[pc], cd_operands[pc]
+
+            if cd_type == InsType.JMP:
+                append('%s => %04d' % (template % (pc, line_number, a), pc + cd + 1))
+                continue
+            if layout == LAYOUT_ABC:
+                line = template % (pc, line_number, a, b_operands[pc], cd)
+            elif layout == LAYOUT_AD:
+                line = template % (pc, line_number, a, cd)
+            elif layout == LAYOUT_A:
+                line = template % (pc, line_number, a)
+            else:
+                line = template % (pc, line_number, cd)
+
+            comment = self._format_operand(prototype, upvalue_names, cd_type, cd) if cd_type is not None else None
+            if a_type is not None and upvalue_names:
+                comment = upvalue_names[a] if comment is None else '{} {}'.format(upvalue_names[a], comment)
+            append(line if comment is None else '{}  ; {}'.format(line, comment))
+
+        lines.append('')
+        self.out.write('\n'.join(lines))
+        self.out.write('\n')
+
+    def _format_operand(self, prototype: Prototype, upvalue_names, operand_type, value):
+        if operand_type in CONSTANT_OPERAND_TYPES:
+            ref = prototype.constants[value].ref
+            if isinstance(ref, str):
+                return self._format_string(ref)
+            elif isinstance(ref, Table):
+                return 'table'
+            elif isinstance(ref, Prototype):
+                return 'prototype {}'.format(ref.number)
+            return str(ref)
+        elif operand_type == InsType.NUM:
+            return str(prototype.numerics[value])
+        elif operand_type == InsType.PRI:
+            return PRIMITIVES[value] if value < len(PRIMITIVES) else None
+        elif operand_type == InsType.UV and upvalue_names:
+            return upvalue_names[value]
+        return None
+
+    def _format_string(self, value: str):
+        if len(value) > MAX_STRING_LENGTH:
+            value = value[:MAX_STRING_LENGTH] + '~'
+        return '"{}"'.format(value.encode('unicode_escape').decode('ascii').replace('"', '\\"'))
@@ -1,4 +1,6 @@
-from bc.data import Table, Prototype, BytecodeDump, VariableInfo, DebugInfo, Instruction, ConstRef, InsType
+from array import array
+
+from bc.data import Table, Prototype, BytecodeDump, VariableInfo, DebugInfo, Instruction, ConstRef, InstructionArray, CONSTANT_OPERAND_TYPES, fields
 
 
 class Formatter(object):
@@ -8,20 +10,45 @@ class Formatter(object):
         self.prototypes = []
         self.code = ''
         self.current_prototype: Prototype = None
+        self.out = None
+        self.definition_count = 0
 
     def format(self):
         self._format(self.dump)
         return 'from bc.data import *\n{}\n{}'.format('\n'.join(self.prototypes), self.code)
 
+    def write(self, out):
+        """
+        Same output as format(), written to the text stream out as it is produced.
+        Prototype and constant definitions are not kept, memory is bounded by the largest prototype.
+        """
+        self.out = out
+        try:
+            out.write('from bc.data import *\n')
+            self._format(self.dump)
+            out.write('\n')
+            out.write(self.code)
+        finally:
+            self.out = None
+
+    def _add_definition(self, definition):
+        if self.out is None:
+            self.prototypes.append(definition)
+        else:
+            if self.definition_count:
+                self.out.write('\n')
+            self.out.write(definition)
+        self.definition_count += 1
+
     def _format(self, obj):
         if isinstance(obj, BytecodeDump):
-            self.code = '''dump = BytecodeDump(\n{})'''.format(self._to_arguments(obj.__dict__))
+            self.code = '''dump = BytecodeDump(\n{})'''.format(self._to_arguments(fields(obj)))
             return 'dump'
 
         elif isinstance(obj, Prototype):
             self.current_prototype = obj
             name = 'prototype_{}'.format(obj.number)
-            self.prototypes.append('{} = Prototype(\n{})'.format(name, self._to_arguments(obj.__dict__)))
+            self._add_definition('{} = Prototype(\n{})'.format(name, self._to_arguments(fields(obj))))
             return name
 
         elif isinstance(obj, Instruction):
@@ -29,22 +56,22 @@ class Formatter(object):
 
         elif isinstance(obj, ConstRef):
             name = 'const_{}'.format(obj.number)
-            self.prototypes.append('{} = ConstRef({})'.format(name, self._format(obj.ref)))
+            self._add_definition('{} = ConstRef({})'.format(name, self._format(obj.ref)))
             return name
 
         elif isinstance(obj, Table):
-            return 'Table(\n{})'.format(self._to_arguments(obj.__dict__))
+            return 'Table(\n{})'.format(self._to_arguments(fields(obj)))
 
         elif isinstance(obj, DebugInfo):
-            return 'DebugInfo(\n{})'.format(self._to_arguments(obj.__dict__))
+            return 'DebugInfo(\n{})'.format(self._to_arguments(fields(obj)))
 
         elif isinstance(obj, VariableInfo):
-            return 'VariableInfo(\n{})'.format(self._to_arguments(obj.__dict__))
+            return 'VariableInfo(\n{})'.format(self._to_arguments(fields(obj)))
 
         elif isinstance(obj, str):
             return obj.__repr__()
 
-        elif isinstance(obj, list):
+        elif isinstance(obj, (list, array, InstructionArray)):
             if not obj:
                 return '[]'
             return '[\n{}]'.format(', \n'.join([self._format(o) for o in obj]))
@@ -66,7 +93,7 @@ class Formatter(object):
         return 'Ins.{}({})'.format(ins.NAME, ', '.join(arguments))
 
     def _format_operand(self, operand_type, value):
-        if operand_type in (InsType.STR, InsType.TAB, InsType.FUN, InsType.CDT):
+        if operand_type in CONSTANT_OPERAND_TYPES:
             c = self.current_prototype.constants[value]
             return 'const_{}'.format(c.number)
         return str(value)
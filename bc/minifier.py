@@ -0,0 +1,166 @@
+from typing import Dict, List
+
+from bc.data import BytecodeDump, Prototype, Table, Const, InstructionArray, INSTRUCTIONS, InsType
+from bc.codec import CD_KINDS, OPERAND_CONST
+from bc.reader import Reader
+from bc.stream import DOUBLE
+from bc.writer import DumpWriter
+
+NUMERIC_OPCODES = frozenset(opcode for opcode, instruction_class in INSTRUCTIONS.items() if instruction_class.CD_TYPE == InsType.NUM)
+
+
+def _item_key(value):
+    # floats by their bits, so 0.0 and -0.0 stay apart; the type keeps True and 1 apart
+    if isinstance(value, float):
+        return 'float', DOUBLE.pack(value)
+    return type(value).__name__, value
+
+
+def _constant_key(ref):
+    if isinstance(ref, str):
+        return 'str', ref
+    if isinstance(ref, Table):
+        return 'tab', tuple(map(_item_key, ref.array)), tuple((_item_key(k), _item_key(v)) for k, v in ref.dictionary)
+    return None  # child prototypes and cdata numbers are left alone
+
+
+def _value_key(ref):
+    if isinstance(ref, Prototype):
+        return 'child',  # matched up by position
+    if isinstance(ref, tuple):
+        return 'complex', tuple(map(_item_key, ref))
+    return _constant_key(ref) or _item_key(ref)
+
+
+class Minifier(object):
+    """
+    Shrinks a dump for shipping: drops debug info and sets the stripped flag, merges identical string and
+    template table constants of a prototype and removes constants no instruction refers to.
+    The numeric constants are merged and dropped the same way, identical meaning the same type and bits.
+    Child prototype constants are always kept, they pair up with the prototypes written before their parent.
+    Dumps with cdata constants (64 bit integers and complex numbers of FFI code) are refused, the writer
+    cannot encode them.
+    """
+
+    def __init__(self, dump: BytecodeDump, encoding='utf-8'):
+        self.dump = dump
+        self.encoding = encoding
+
+    def minify(self) -> Dict[int, int]:
+        """Transform the dump in place, returns the bytes saved per prototype number"""
+        prototypes = self._prototypes()
+        for prototype in prototypes:
+            if any(not isinstance(c.ref, (str, Table, Prototype)) for c in prototype.constants):
+                raise Exception("Cannot minify prototype {0}, it has cdata constants".format(prototype.number))
+        writer = DumpWriter(self.dump, None, self.encoding)
+        layout = self.dump.layout()
+        sizes = {prototype.number: len(prototype.raw if prototype.raw_fits(layout) else writer.encode_prototype(prototype)) for prototype in prototypes}
+
+        self.dump.is_stripped = Const.FLAG_IS_STRIPPED
+        for prototype in prototypes:
+            self._strip(prototype)
+            self._compact_constants(prototype)
+            self._compact_numerics(prototype)
+            prototype.mark_dirty()
+
+        writer = DumpWriter(self.dump, None, self.encoding)
+        return {prototype.number: sizes[prototype.number] - len(writer.encode_prototype(prototype)) for prototype in prototypes}
+
+    def verify(self, data: bytes):
+        """Read a minified dump back and compare it with the transformed model"""
+        reader = Reader(data, self.encoding)
+        reader.read()
+        expected = self._prototypes()
+        actual = self._prototypes(reader.dump)
+        if not reader.dump.is_stripped or len(actual) != len(expected):
+            raise Exception("Minified dump does not match: {0} of {1} prototypes read".format(len(actual), len(expected)))
+        for a, b in zip(actual, expected):
+            if self._contents(a) != self._contents(b):
+                raise Exception("Minified dump does not match at prototype {0}".format(b.number))
+
+    @staticmethod
+    def _contents(prototype: Prototype) -> tuple:
+        # the head instruction is not written, the reader derives it from the flags and frame size
+        flags = prototype.has_ffi | prototype.has_iloop | prototype.is_jit_disabled | prototype.has_sub_prototypes | prototype.is_variadic
+        return (flags, prototype.argument_count, prototype.frame_size,
+                [(ins.OPCODE, tuple(vars(ins).items())) for ins in prototype.instructions[1:]],
+                list(prototype.upvalues), [_item_key(n) for n in prototype.numerics],
+                [_value_key(c.ref) for c in prototype.constants], prototype.debug_info is None)
+
+    def _prototypes(self, dump: BytecodeDump = None) -> List[Prototype]:
+        prototypes = []
+        stack = list((dump or self.dump).prototypes)
+        while stack:
+            prototype = stack.pop()
+            prototypes.append(prototype)
+            stack.extend(c.ref for c in prototype.constants if isinstance(c.ref, Prototype))
+        return prototypes
+
+    def _strip(self, prototype: Prototype):
+        prototype.debug_info = None
+        prototype.debug_info_size = 0
+        prototype.first_line_number = 0
+        prototype.line_count = 0
+
+    def _compact_constants(self, prototype: Prototype):
+        references, used = self._references(prototype, lambda opcode: CD_KINDS[opcode] == OPERAND_CONST)
+
+        constants = []
+        remap = {}
+        seen = {}
+        for index, constant in enumerate(prototype.constants):
+            key = _constant_key(constant.ref)
+            if key is not None:
+                if index not in used:
+                    continue
+                if key in seen:
+                    remap[index] = seen[key]
+                    continue
+                seen[key] = len(constants)
+            remap[index] = len(constants)
+            constants.append(constant)
+
+        if len(constants) == len(prototype.constants):
+            return
+        prototype.constants = constants
+        prototype.constant_count = len(constants)
+        self._remap(prototype, references, remap)
+
+    def _compact_numerics(self, prototype: Prototype):
+        references, used = self._references(prototype, NUMERIC_OPCODES.__contains__)
+
+        numerics = []
+        remap = {}
+        seen = {}
+        for index, number in enumerate(prototype.numerics):
+            if index not in used:
+                continue
+            key = _item_key(number)
+            if key not in seen:
+                seen[key] = len(numerics)
+                numerics.append(number)
+            remap[index] = seen[key]
+
+        if len(numerics) == len(prototype.numerics):
+            return
+        prototype.numerics = numerics
+        prototype.numeric_count = len(numerics)
+        self._remap(prototype, references, remap)
+
+    def _references(self, prototype: Prototype, is_reference) -> tuple:
+        """Instructions whose CD operand is an index is_reference(opcode) accepts, and the set of indices they use"""
+        instructions = prototype.instructions
+        if isinstance(instructions, InstructionArray):
+            references = [i for i, opcode in enumerate(instructions.opcodes) if is_reference(opcode)]
+            return references, {instructions.cd[i] for i in references}
+        references = [ins for ins in instructions if is_reference(ins.OPCODE)]
+        return references, {ins.cd for ins in references}
+
+    def _remap(self, prototype: Prototype, references: list, remap: Dict[int, int]):
+        instructions = prototype.instructions
+        if isinstance(instructions, InstructionArray):
+            for i in references:
+                instructions.cd[i] = remap[instructions.cd[i]]
+        else:
+            for ins in references:
+                ins.cd = remap[ins.cd]
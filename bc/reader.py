@@ -1,7 +1,11 @@
 import sys
+from array import array
+from typing import List, Iterator
 
-from bc.data import Table, Prototype, BytecodeDump, VariableInfo, DebugInfo, INSTRUCTIONS, Instruction, ConstRef, Const, Ins, InsType
-from bc.stream import Stream
+from bc.data import Table, Prototype, BytecodeDump, VariableInfo, DebugInfo, INSTRUCTIONS, ConstRef, Const, Ins, InstructionArray, \
+    make_instruction, fields
+from bc.codec import split_codewords
+from bc.stream import Stream, MemoryStream, assemble_floats, combine_float_words
 
 
 class Sequence(object):
@@ -14,22 +18,197 @@ class Sequence(object):
         return v
 
 
+class LazyPrototype(Prototype):
+    """
+    Prototype read from its header only, see Reader(lazy=True).
+    Instructions, upvalues, constants, numerics and debug info are parsed on first access.
+    """
+    __slots__ = ('reader', 'size', 'offset', 'parent', 'children', 'is_loaded')
+
+    def __init__(self, reader, **kwargs):
+        self.reader: Reader = reader
+        self.size = 0
+        self.offset = 0  # stream position of the first instruction
+        self.parent: LazyPrototype = None
+        self.children: List[LazyPrototype] = []  # in constant table order
+        self.is_loaded = False
+        super().__init__(**kwargs)
+        for key in self.BODY:
+            delattr(self, key)
+
+    def load(self) -> 'LazyPrototype':
+        if not self.is_loaded:
+            self.reader.load_prototype(self)
+        return self
+
+    def child_prototypes(self) -> List[Prototype]:
+        if self.is_loaded:
+            return super().child_prototypes()
+        return self.children  # known from the index, the body is not parsed for them
+
+    def __getattr__(self, name):
+        # only called for slots which are not set yet
+        if name in LazyPrototype.BODY and not self.is_loaded:
+            self.load()
+            return getattr(self, name)
+        raise AttributeError(name)
+
+
+class LazyDebugInfo(DebugInfo):
+    """Debug info kept as the raw section bytes, see Reader(debug_info='lazy'). Decoded on first access"""
+    __slots__ = ('reader', 'prototype', 'raw', 'is_loaded')
+
+    def __init__(self, reader, prototype: Prototype, raw: bytes):
+        self.reader: Reader = reader
+        self.prototype = prototype
+        self.raw = raw
+        self.is_loaded = False
+        super().__init__()
+        for key in self.FIELDS:
+            delattr(self, key)
+
+    def load(self) -> 'LazyDebugInfo':
+        if not self.is_loaded:
+            self.reader.load_debug_info(self)
+        return self
+
+    def __getattr__(self, name):
+        # only called for slots which are not set yet
+        if name in DebugInfo.FIELDS and not self.is_loaded:
+            self.load()
+            return getattr(self, name)
+        raise AttributeError(name)
+
+
+class DumpSummary(object):
+    """Header fields and rough size of a dump, see Reader.probe()"""
+    __slots__ = FIELDS = ('origin', 'name', 'version', 'is_big_endian', 'is_stripped', 'has_ffi', 'size', 'prototype_count', 'instruction_count')
+
+    def __init__(self, **kwargs):
+        self.origin = ''
+        self.name = ''
+        self.version = 0
+        self.is_big_endian = False
+        self.is_stripped = False
+        self.has_ffi = False
+        self.size = 0  # bytes
+        self.prototype_count = None  # only counted on request
+        self.instruction_count = None
+        for key, value in kwargs.items():
+            setattr(self, key, value)
+
+    def __repr__(self):
+        return 'DumpSummary({})'.format(', '.join('{}={!r}'.format(k, v) for k, v in fields(self).items()))
+
+
 class Reader(object):
-    def __init__(self, filename, encoding):
+    DEBUG_INFO_FULL = 'full'
+    DEBUG_INFO_SKIP = 'skip'
+    DEBUG_INFO_LAZY = 'lazy'
+
+    def __init__(self, filename, encoding, in_memory=True, lazy=False, debug_info=DEBUG_INFO_FULL, compact=False, keep_raw=False):
+        """
+        :param filename: file name, file object, or bytes like object holding the dump
+        :param in_memory: read through a memory mapped MemoryStream instead of per field file reads
+        :param lazy: only index prototype headers and parent/child links, prototype bodies are parsed on demand.
+        The stream is kept open until close()
+        :param debug_info: DEBUG_INFO_FULL decodes debug info while reading, DEBUG_INFO_SKIP seeks over it and leaves
+        prototype.debug_info None, DEBUG_INFO_LAZY keeps the raw section and decodes it on first access
+        :param compact: store instructions in an InstructionArray instead of a list of Instruction objects
+        :param keep_raw: keep the encoded body of each prototype in prototype.raw. DumpWriter copies these bodies
+        verbatim until the prototype changes, see Prototype.is_dirty
+        """
         self.encoding = encoding
         self.filename = filename
+        self.in_memory = in_memory or isinstance(filename, (bytes, bytearray, memoryview))
+        self.lazy = lazy
+        self.debug_info = debug_info
+        self.compact = compact
+        self.keep_raw = keep_raw
         self.stream: Stream = None
         self.dump: BytecodeDump = None
+        self.layout: tuple = None  # dump.layout() as read, the dump flags may be changed later
+        self.index: List[LazyPrototype] = []  # all prototypes in file order, lazy mode only
         self.prototype_number = Sequence()
         self.const_number: Sequence = None
+        self.child_stack: List[Prototype] = None  # read but not yet referenced prototypes
 
     def read(self):
-        self.stream = Stream.open(self.filename)
+        if self.lazy:
+            self._open()
+            self._index_prototypes()
+        else:
+            for _ in self.iter_prototypes():
+                pass
+            # prototypes no other prototype refers to, usually only the main chunk
+            self.dump.prototypes = self.child_stack
+
+    def iter_prototypes(self, link_children=True) -> Iterator[Prototype]:
+        """
+        Yield prototypes in file order as soon as each one is parsed, children before their parent.
+        The reader only keeps prototypes that no parent has referred to yet. With link_children=False
+        these are header only copies, so memory use stays flat no matter how large the dump is.
+        self.dump holds the dump header, its prototypes list is left empty.
+        """
+        self._open()
+        self.child_stack = []
+        try:
+            while True:
+                prototype = self._read_prototype()
+                if not prototype:
+                    break
+                self.child_stack.append(prototype if link_children else self._header_of(prototype))
+                yield prototype
+        finally:
+            self.stream.close()
+
+    def _header_of(self, prototype: Prototype) -> Prototype:
+        return Prototype(**{k: v for k, v in fields(prototype).items() if k not in LazyPrototype.BODY})
+
+    def close(self):
+        self.stream.close()
+
+    def probe(self, count_prototypes=False) -> DumpSummary:
+        """
+        Read only the dump header, for classifying many files quickly.
+        With count_prototypes the prototype size prefixes are walked as well to count prototypes and instructions,
+        nothing else is decoded.
+        """
+        self._open()
+        try:
+            summary = DumpSummary(origin=self.dump.origin, name=self.dump.name, version=self.dump.version, is_big_endian=bool(self.dump.is_big_endian),
+                                  is_stripped=bool(self.dump.is_stripped), has_ffi=bool(self.dump.has_ffi), size=self.stream.length())
+            if count_prototypes:
+                summary.prototype_count, summary.instruction_count = self._count_prototypes()
+        finally:
+            self.stream.close()
+        return summary
+
+    def _count_prototypes(self):
+        prototype_count = 0
+        instruction_count = 0
+        while True:
+            size = self.stream.read_uleb128()
+            if size == 0:
+                break
+            end = self.stream.tell() + size
+            self.stream.skip(4)  # flags, argument count, frame size, upvalue count
+            _, _, count = self.stream.read_uleb128_array(3)  # constant, numeric and instruction counts
+            prototype_count += 1
+            instruction_count += count
+            self.stream.seek(end)
+        return prototype_count, instruction_count
+
+    def _open(self):
+        self.stream = self._open_stream()
         self.dump = BytecodeDump()
         self.dump.origin = self.stream.name
         self._read_header()
-        self._read_prototypes()
-        self.stream.close()
+
+    def _open_stream(self) -> Stream:
+        if self.in_memory:
+            return MemoryStream.open(self.filename)
+        return Stream.open(self.filename)
 
     def _read_header(self):
         self._check_magic()
@@ -37,6 +216,7 @@ class Reader(object):
         self._read_flags()
         self._read_name()
         self.stream.byteorder = 'big' if self.dump.is_big_endian else 'little'
+        self.layout = self.dump.layout()
 
     def _check_magic(self):
         if self.stream.read_bytes(3) != Const.MAGIC:
@@ -65,19 +245,13 @@ class Reader(object):
             length = self.stream.read_uleb128()
             self.dump.name = self.stream.read_bytes(length).decode(self.encoding)
 
-    def _read_prototypes(self):
-        while True:
-            prototype = self._read_prototype()
-            if not prototype:
-                break
-            self.dump.prototypes.append(prototype)
-
     def _read_prototype(self):
         size = self.stream.read_uleb128()
         if size == 0:
             return None
 
         prototype = Prototype(number=self.prototype_number.next())
+        start = self.stream.tell()
         self.const_number = Sequence()
         self._read_prototype_flags(prototype)
         self._read_counts_and_sizes(prototype)
@@ -87,8 +261,89 @@ class Reader(object):
         self._read_numeric_constants(prototype)
         self._read_debug_info(prototype)
 
+        if self.keep_raw:
+            prototype.set_raw(self._read_raw(start, size), self.layout)
         return prototype
 
+    def _read_raw(self, start, size) -> bytes:
+        self.stream.seek(start)
+        return self.stream.read_bytes(size)
+
+    def _index_prototypes(self):
+        self.child_stack = self.dump.prototypes
+        while True:
+            size = self.stream.read_uleb128()
+            if size == 0:
+                break
+            end = self.stream.tell() + size
+
+            prototype = LazyPrototype(self, number=self.prototype_number.next())
+            prototype.size = size
+            self._read_prototype_flags(prototype)
+            self._read_counts_and_sizes(prototype)
+            prototype.offset = self.stream.tell()
+            if self.keep_raw:
+                # the body state is recorded when it is loaded
+                prototype.set_raw(self._read_raw(end - size, size), self.layout, body_read=False)
+                self.stream.seek(prototype.offset)
+            if prototype.has_sub_prototypes:
+                self.stream.skip(prototype.instruction_count * 4 + prototype.upvalue_count * 2)
+                self._index_children(prototype)
+            self.stream.seek(end)
+
+            self.index.append(prototype)
+            self.dump.prototypes.append(prototype)
+
+    def _index_children(self, prototype: LazyPrototype):
+        for _ in range(prototype.constant_count):
+            constant_type = self.stream.read_uleb128()
+
+            if constant_type >= Const.BCDUMP_KGC_STR:
+                self.stream.skip(constant_type - Const.BCDUMP_KGC_STR)
+            elif constant_type == Const.BCDUMP_KGC_TAB:
+                self._skip_table()
+            elif constant_type == Const.BCDUMP_KGC_COMPLEX:
+                self.stream.read_uleb128_array(4)
+            elif constant_type != Const.BCDUMP_KGC_CHILD:
+                self.stream.read_uleb128_array(2)
+            else:
+                child = self.child_stack.pop()
+                child.parent = prototype
+                prototype.children.append(child)
+
+    def _skip_table(self):
+        array_items_count, hash_items_count = self.stream.read_uleb128_array(2)
+        for _ in range(array_items_count + hash_items_count * 2):
+            data_type = self.stream.read_uleb128()
+            if data_type >= Const.BCDUMP_KTAB_STR:
+                self.stream.skip(data_type - Const.BCDUMP_KTAB_STR)
+            elif data_type == Const.BCDUMP_KTAB_INT:
+                self.stream.read_uleb128()
+            elif data_type == Const.BCDUMP_KTAB_NUM:
+                self.stream.read_uleb128_array(2)
+
+    def load_prototype(self, prototype: LazyPrototype):
+        """Parse the body of a prototype found by a lazy read"""
+        is_dirty = prototype.is_dirty
+        prototype.instructions, prototype.upvalues, prototype.numerics, prototype.constants, prototype.debug_info = [], array('H'), [], [], None
+        try:
+            self.stream.seek(prototype.offset)
+            self.const_number = Sequence()
+            self.child_stack = prototype.children[::-1]
+            self._read_instructions(prototype)
+            self._read_upvalue_references(prototype)
+            self._read_complex_constants(prototype)
+            self._read_numeric_constants(prototype)
+            self._read_debug_info(prototype)
+        except BaseException:
+            for key in LazyPrototype.BODY:
+                delattr(prototype, key)
+            raise
+        prototype.is_loaded = True
+        if not is_dirty:
+            # loading is not a change, header changes made before the load still count
+            prototype.set_raw(prototype.raw, self.layout)
+
     def _read_prototype_flags(self, prototype: Prototype):
         bits = self.stream.read_byte()
 
@@ -115,129 +370,132 @@ class Reader(object):
             prototype.line_count = self.stream.read_uleb128()
 
     def _read_instructions(self, prototype: Prototype):
-        head = Ins.FUNCV() if prototype.is_variadic else Ins.FUNCF()
-        head.a = prototype.frame_size
-        prototype.instructions.append(head)
-        prototype.instructions.extend([self._read_instruction(prototype) for _ in range(prototype.instruction_count)])
-
-    def _read_instruction(self, prototype: Prototype) -> Instruction:
-        codeword = self.stream.read_uint(4)
-        opcode = codeword & 0xFF
-        instruction_class = INSTRUCTIONS[opcode]
-
-        if instruction_class is None:
-            raise Exception("Warning: unknown opcode {0:08x}", opcode)
-
-        ins: Instruction = instruction_class()
-
-        arg_count = 0
-        if ins.A_TYPE is not None:
-            arg_count += 1
-        if ins.B_TYPE is not None:
-            arg_count += 1
-        if ins.CD_TYPE is not None:
-            arg_count += 1
-
-        if arg_count == 3:
-            a = (codeword >> 8) & 0xFF
-            cd = (codeword >> 16) & 0xFF
-            b = (codeword >> 24) & 0xFF
+        head = make_instruction(Ins.FUNCV.OPCODE if prototype.is_variadic else Ins.FUNCF.OPCODE, prototype.frame_size, 0, 0)
+        codewords = self.stream.read_uint_array(prototype.instruction_count)
+        operands = self._split_instructions(prototype, codewords)
+        if self.compact:
+            prototype.instructions = InstructionArray([head])
+            prototype.instructions.extend_operands(*operands)
         else:
-            a = (codeword >> 8) & 0xFF
-            b = None
-            cd = (codeword >> 16) & 0xFFFF
-
-        if ins.A_TYPE is not None:
-            ins.a = self._process_operand(prototype, ins.A_TYPE, a)
-        if ins.B_TYPE is not None:
-            ins.b = self._process_operand(prototype, ins.B_TYPE, b)
-        if ins.CD_TYPE is not None:
-            ins.cd = self._process_operand(prototype, ins.CD_TYPE, cd)
-
-        return ins
-
-    def _process_operand(self, prototype: Prototype, op_type, op):
-        if op_type in (InsType.STR, InsType.TAB, InsType.FUN, InsType.CDT):
-            return prototype.constant_count - op - 1
-        elif op_type == InsType.JMP:
-            return op - 0x8000
-        elif op_type == InsType.SLIT:
-            return op - 0x10000 if op & 0x8000 else op
-        else:
-            return op
+            prototype.instructions.append(head)
+            prototype.instructions.extend(map(make_instruction, *operands))
+
+    def _split_instructions(self, prototype: Prototype, codewords) -> tuple:
+        """Opcode, a, b and cd sequences of the codewords, refuses opcodes without an instruction class"""
+        operands = split_codewords(codewords, prototype.constant_count - 1)
+        # opcodes are numbered from 0, the largest one tells if any is unknown without building a set
+        unknown = max(operands[0], default=0) >= len(INSTRUCTIONS) and set(operands[0]) - INSTRUCTIONS.keys()
+        if unknown:
+            raise ValueError("Unknown opcodes in prototype {0}: {1}".format(prototype.number, ', '.join('{0:02x}'.format(o) for o in sorted(unknown))))
+        return operands
 
     def _read_upvalue_references(self, prototype: Prototype):
-        prototype.upvalues.extend(self.stream.read_uint(2) for _ in range(prototype.upvalue_count))
+        prototype.upvalues = self.stream.read_uint_array(prototype.upvalue_count, 2)
 
     def _read_complex_constants(self, prototype: Prototype):
+        constants = []
         for _ in range(prototype.constant_count):
             constant_type = self.stream.read_uleb128()
             const_number = '{}_{}'.format(prototype.number, self.const_number.next())
 
             if constant_type >= Const.BCDUMP_KGC_STR:
                 length = constant_type - Const.BCDUMP_KGC_STR
-                prototype.constants.append(ConstRef(self.stream.read_bytes(length).decode(self.encoding), const_number))
+                constants.append(ConstRef(self.stream.read_bytes(length).decode(self.encoding), const_number))
 
             elif constant_type == Const.BCDUMP_KGC_TAB:
-                prototype.constants.append(ConstRef(self._read_table(), const_number))
+                constants.append(ConstRef(self._read_table(), const_number))
 
             elif constant_type != Const.BCDUMP_KGC_CHILD:
                 number = self.stream.read_float()
 
                 if constant_type == Const.BCDUMP_KGC_COMPLEX:
-                    prototype.constants.append(ConstRef((number, self.stream.read_float()), const_number))
+                    constants.append(ConstRef((number, self.stream.read_float()), const_number))
                 else:
-                    prototype.constants.append(ConstRef(number, const_number))
+                    constants.append(ConstRef(number, const_number))
 
             else:
-                prototype.constants.append(ConstRef(self.dump.prototypes.pop(), const_number))
+                constants.append(ConstRef(self.child_stack.pop(), const_number))
+        prototype.constants = constants
 
     def _read_numeric_constants(self, prototype: Prototype):
-        for _ in range(prototype.numeric_count):
-            prototype.numerics.append(self.stream.read_uleb128_33())
+        prototype.numerics.extend(self.stream.read_uleb128_33_array(prototype.numeric_count))
 
     def _read_table(self) -> Table:
         table = Table()
-        array_items_count = self.stream.read_uleb128()
-        hash_items_count = self.stream.read_uleb128()
-
-        for _ in range(array_items_count):
-            table.array.append(self._read_table_item())
+        array_items_count, hash_items_count = self.stream.read_uleb128_array(2)
+        items = self._read_table_items(array_items_count + hash_items_count * 2)
 
-        for _ in range(hash_items_count):
-            table.dictionary.append(((self._read_table_item()), (self._read_table_item())))
+        table.array = items[:array_items_count]
+        table.dictionary = list(zip(items[array_items_count::2], items[array_items_count + 1::2]))
 
         return table
 
-    def _read_table_item(self):
-        data_type = self.stream.read_uleb128()
+    def _read_table_items(self, count) -> list:
+        items = []
+        float_indices = []
+        float_bits = []
 
-        if data_type >= Const.BCDUMP_KTAB_STR:
-            length = data_type - Const.BCDUMP_KTAB_STR
+        for index in range(count):
+            data_type = self.stream.read_uleb128()
 
-            return self.stream.read_bytes(length).decode(self.encoding)
+            if data_type >= Const.BCDUMP_KTAB_STR:
+                length = data_type - Const.BCDUMP_KTAB_STR
+                items.append(self.stream.read_bytes(length).decode(self.encoding))
 
-        elif data_type == Const.BCDUMP_KTAB_INT:
-            return self.stream.read_signed_int()
+            elif data_type == Const.BCDUMP_KTAB_INT:
+                items.append(self.stream.read_signed_int())
 
-        elif data_type == Const.BCDUMP_KTAB_NUM:
-            return self.stream.read_float()
+            elif data_type == Const.BCDUMP_KTAB_NUM:
+                # assembled with the other floats of the table after all items are read
+                lo, hi = self.stream.read_uleb128_array(2)
+                float_indices.append(index)
+                float_bits.append(combine_float_words(lo, hi))
+                items.append(None)
 
-        elif data_type == Const.BCDUMP_KTAB_TRUE:
-            return True
+            elif data_type == Const.BCDUMP_KTAB_TRUE:
+                items.append(True)
 
-        elif data_type == Const.BCDUMP_KTAB_FALSE:
-            return False
+            elif data_type == Const.BCDUMP_KTAB_FALSE:
+                items.append(False)
 
-        else:  # Const.BCDUMP_KTAB_NIL
-            return None
+            else:  # Const.BCDUMP_KTAB_NIL
+                items.append(None)
+
+        for index, value in zip(float_indices, assemble_floats(float_bits)):
+            items[index] = value
+        return items
 
     def _read_debug_info(self, prototype: Prototype):
         if prototype.debug_info_size > 0:
-            prototype.debug_info = DebugInfo()
-            self._read_line_info(prototype)
-            self._read_upvalue_names(prototype)
-            self._read_variable_info(prototype)
+            if self.debug_info == self.DEBUG_INFO_SKIP:
+                self.stream.skip(prototype.debug_info_size)
+            elif self.debug_info == self.DEBUG_INFO_LAZY:
+                prototype.debug_info = LazyDebugInfo(self, prototype, self.stream.read_bytes(prototype.debug_info_size))
+            else:
+                prototype.debug_info = DebugInfo()
+                self._read_debug_info_sections(prototype)
+
+    def _read_debug_info_sections(self, prototype: Prototype):
+        self._read_line_info(prototype)
+        self._read_upvalue_names(prototype)
+        self._read_variable_info(prototype)
+
+    def load_debug_info(self, debug_info: LazyDebugInfo):
+        """Decode debug info kept raw by a DEBUG_INFO_LAZY read"""
+        debug_info.addr_to_line_map, debug_info.upvalue_variable_names, debug_info.variable_infos = array('I'), [], []
+        stream = self.stream
+        self.stream = MemoryStream.open(debug_info.raw)
+        self.stream.byteorder = stream.byteorder
+        try:
+            self._read_debug_info_sections(debug_info.prototype)
+        except BaseException:
+            for key in DebugInfo.FIELDS:
+                delattr(debug_info, key)
+            raise
+        finally:
+            self.stream.close()
+            self.stream = stream
+        debug_info.is_loaded = True
 
     def _read_line_info(self, prototype: Prototype):
         if prototype.line_count >= 65536:
@@ -247,8 +505,9 @@ class Reader(object):
         else:
             line_info_size = 1
 
+        first_line_number = prototype.first_line_number
         prototype.debug_info.addr_to_line_map.append(0)
-        prototype.debug_info.addr_to_line_map.extend([prototype.first_line_number + self.stream.read_uint(line_info_size) for _ in range(prototype.instruction_count)])
+        prototype.debug_info.addr_to_line_map.extend([first_line_number + line for line in self.stream.read_uint_array(prototype.instruction_count, line_info_size)])
 
     def _read_upvalue_names(self, prototype: Prototype):
         prototype.debug_info.upvalue_variable_names.extend([self.stream.read_zstring().decode(self.encoding) for _ in range(prototype.upvalue_count)])
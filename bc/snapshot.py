@@ -0,0 +1,320 @@
+"""
+Binary snapshots of parsed dumps, for reloading pre-parsed corpora without reading the bytecode again.
+
+Layout: magic, format version (u16), layout checksum (u32), crc32 of the payload (u32), payload size (u64), payload.
+The payload is a fixed sequence of typed little endian columns, each a typecode, a byte size (u64) and the array
+bytes. Every object of the dump is spread over the columns in a fixed order, children before their parents:
+header fields per prototype, instruction operands, upvalues, constants, table items, debug info and strings.
+Nothing in a snapshot is executed on load. The layout checksum covers the field names of the data classes,
+snapshots of an older object model are refused instead of being read into the wrong fields.
+"""
+import gc
+import struct
+import sys
+import zlib
+from array import array
+
+from bc.data import BytecodeDump, Prototype, ConstRef, Table, DebugInfo, VariableInfo, InstructionArray, make_instruction, \
+    instruction_operands
+
+MAGIC = b'LJSN'
+VERSION = 2
+HEADER = struct.Struct('<4sHIIQ')
+COLUMN = struct.Struct('<cQ')
+
+# name, typecode, in payload order
+COLUMNS = (
+    ('dump', 'q'),  # number, flags and version of the dump, the root prototype count
+    ('roots', 'q'),  # root prototype indices
+    ('headers', 'q'),  # Prototype.HEADER fields of each prototype
+    ('bodies', 'q'),  # per prototype: compact flag and the lengths of its body lists
+    ('opcodes', 'B'),
+    ('a', 'B'),
+    ('b', 'B'),
+    ('cd', 'i'),
+    ('upvalues', 'H'),
+    ('constants', 'q'),  # kind of each constant, followed by the prototype index for children
+    ('tables', 'q'),  # array and dictionary lengths
+    ('kinds', 'B'),  # scalar values: numerics, constant numbers and values, table items
+    ('ints', 'q'),
+    ('floats', 'd'),
+    ('debug', 'q'),  # per debug info: line map, upvalue name and variable counts, then start, end and type of the variables
+    ('lines', 'I'),
+    ('string_lengths', 'q'),  # -1 for None
+    ('strings', 'B'),  # utf-8 of all strings joined
+)
+LAYOUT = zlib.crc32(repr((COLUMNS, BytecodeDump.FIELDS, Prototype.FIELDS, ConstRef.FIELDS, Table.FIELDS,
+                          DebugInfo.FIELDS, VariableInfo.FIELDS)).encode())
+
+DUMP_FIELDS = ('number', 'is_stripped', 'is_big_endian', 'has_ffi', 'version')
+
+VALUE_NIL, VALUE_FALSE, VALUE_TRUE, VALUE_INT, VALUE_FLOAT, VALUE_STR = range(6)
+CONST_VALUE, CONST_TABLE, CONST_CHILD, CONST_COMPLEX = range(4)
+
+_new = object.__new__
+
+
+class _Encoder(object):
+    def __init__(self):
+        self.columns = {name: array(typecode) for name, typecode in COLUMNS}
+        self.strings = []
+        self.prototype_index = {}
+
+    def encode(self, dump: BytecodeDump) -> bytes:
+        columns = self.columns
+        columns['dump'].extend(int(getattr(dump, name)) for name in DUMP_FIELDS)
+        columns['dump'].append(len(dump.prototypes))
+        self.string(dump.origin)
+        self.string(dump.name)
+        # lazy prototypes and debug info are parsed, raw bodies and lookup maps are not kept
+        for index, prototype in enumerate(dump.sorted_prototypes()):
+            self.prototype_index[prototype] = index
+            self.prototype(prototype)
+        columns['roots'].extend(self.prototype_index[prototype] for prototype in dump.prototypes)
+
+        text = ''.join(self.strings).encode('utf-8', 'surrogatepass')
+        columns['strings'].frombytes(text)
+        out = []
+        for name, typecode in COLUMNS:
+            values = columns[name]
+            if sys.byteorder == 'big':
+                values.byteswap()
+            data = values.tobytes()
+            out.append(COLUMN.pack(typecode.encode(), len(data)))
+            out.append(data)
+        return b''.join(out)
+
+    def prototype(self, prototype: Prototype):
+        columns = self.columns
+        columns['headers'].extend(int(getattr(prototype, name)) for name in Prototype.HEADER)
+        instructions = prototype.instructions
+        operands = instruction_operands(instructions)
+        for name, values in zip(('opcodes', 'a', 'b', 'cd'), operands):
+            columns[name].extend(values)
+        columns['upvalues'].extend(prototype.upvalues)
+        for number in prototype.numerics:
+            self.value(number)
+        for const in prototype.constants:
+            self.constant(const)
+        debug_info = prototype.debug_info
+        columns['bodies'].extend((isinstance(instructions, InstructionArray), len(operands[0]), len(prototype.upvalues),
+                                  len(prototype.numerics), len(prototype.constants), debug_info is not None))
+        if debug_info is not None:
+            self.debug_info(debug_info)
+
+    def constant(self, const: ConstRef):
+        constants = self.columns['constants']
+        ref = const.ref
+        self.value(const.number)
+        if isinstance(ref, Prototype):
+            constants.extend((CONST_CHILD, self.prototype_index[ref]))
+        elif isinstance(ref, Table):
+            constants.append(CONST_TABLE)
+            self.columns['tables'].extend((len(ref.array), len(ref.dictionary)))
+            for item in ref.array:
+                self.value(item)
+            for key, item in ref.dictionary:
+                self.value(key)
+                self.value(item)
+        elif isinstance(ref, tuple):
+            constants.append(CONST_COMPLEX)
+            self.value(ref[0])
+            self.value(ref[1])
+        else:
+            constants.append(CONST_VALUE)
+            self.value(ref)
+
+    def value(self, value):
+        kinds = self.columns['kinds']
+        if value is None:
+            kinds.append(VALUE_NIL)
+        elif value is False:
+            kinds.append(VALUE_FALSE)
+        elif value is True:
+            kinds.append(VALUE_TRUE)
+        elif isinstance(value, int):
+            kinds.append(VALUE_INT)
+            self.columns['ints'].append(value)
+        elif isinstance(value, float):
+            kinds.append(VALUE_FLOAT)
+            self.columns['floats'].append(value)
+        elif isinstance(value, str):
+            kinds.append(VALUE_STR)
+            self.string(value)
+        else:
+            raise Exception("Cannot store value {0!r} in a snapshot".format(value))
+
+    def string(self, value):
+        if value is None:
+            self.columns['string_lengths'].append(-1)
+        else:
+            self.columns['string_lengths'].append(len(value))
+            self.strings.append(value)
+
+    def debug_info(self, debug_info: DebugInfo):
+        debug = self.columns['debug']
+        debug.extend((len(debug_info.addr_to_line_map), len(debug_info.upvalue_variable_names), len(debug_info.variable_infos)))
+        self.columns['lines'].extend(debug_info.addr_to_line_map)
+        for name in debug_info.upvalue_variable_names:
+            self.string(name)
+        for variable in debug_info.variable_infos:
+            debug.extend((variable.start_addr, variable.end_addr, variable.type))
+            self.string(variable.name)
+
+
+class _Decoder(object):
+    def __init__(self, payload: memoryview):
+        self.columns = {}
+        pos = 0
+        for name, typecode in COLUMNS:
+            if len(payload) < pos + COLUMN.size:
+                raise Exception("Truncated snapshot payload")
+            stored_typecode, size = COLUMN.unpack_from(payload, pos)
+            pos += COLUMN.size
+            values = array(typecode)
+            if stored_typecode != typecode.encode() or size % values.itemsize or len(payload) < pos + size:
+                raise Exception("Malformed snapshot column {0}".format(name))
+            values.frombytes(payload[pos:pos + size])
+            if sys.byteorder == 'big':
+                values.byteswap()
+            self.columns[name] = values
+            pos += size
+
+        lengths = self.columns['string_lengths']
+        text = self.columns['strings'].tobytes().decode('utf-8', 'surrogatepass')
+        strings, pos = [], 0
+        for length in lengths:
+            if length < 0:
+                strings.append(None)
+            else:
+                strings.append(text[pos:pos + length])
+                pos += length
+        self.strings = iter(strings)
+        self.kinds, self.ints, self.floats = iter(self.columns['kinds']), iter(self.columns['ints']), iter(self.columns['floats'])
+        self.operand_pos = 0
+        self.prototypes = []
+
+    def decode(self) -> BytecodeDump:
+        columns = self.columns
+        dump = BytecodeDump(**dict(zip(DUMP_FIELDS, columns['dump'])))
+        dump.origin = next(self.strings)
+        dump.name = next(self.strings)
+        header_size = len(Prototype.HEADER)
+        headers = columns['headers']
+        self.constants, self.tables, self.debug = iter(columns['constants']), iter(columns['tables']), iter(columns['debug'])
+        self.upvalue_pos = self.line_pos = 0
+        for index in range(len(headers) // header_size):
+            self.prototypes.append(self.prototype(headers[index * header_size:(index + 1) * header_size], columns['bodies'][index * 6:index * 6 + 6]))
+        dump.prototypes = [self.prototypes[index] for index in columns['roots']]
+        if len(dump.prototypes) != columns['dump'][-1]:
+            raise Exception("Malformed snapshot, root prototypes do not match")
+        return dump
+
+    def prototype(self, header, body) -> Prototype:
+        columns = self.columns
+        prototype = _new(Prototype)
+        for name in Prototype.__slots__:
+            setattr(prototype, name, None)
+        prototype.edits = 0
+        for name, value in zip(Prototype.HEADER, header):
+            setattr(prototype, name, value)
+        compact, instruction_count, upvalue_count, numeric_count, constant_count, has_debug_info = body
+
+        start, end = self.operand_pos, self.operand_pos + instruction_count
+        operands = [columns[name][start:end] for name in ('opcodes', 'a', 'b', 'cd')]
+        self.operand_pos = end
+        if compact:
+            prototype.instructions = InstructionArray()
+            prototype.instructions.extend_operands(*operands)
+        else:
+            prototype.instructions = list(map(make_instruction, *operands))
+        prototype.upvalues = columns['upvalues'][self.upvalue_pos:self.upvalue_pos + upvalue_count]
+        self.upvalue_pos += upvalue_count
+        prototype.numerics = [self.value() for _ in range(numeric_count)]
+        prototype.constants = [self.constant() for _ in range(constant_count)]
+        prototype.debug_info = self.debug_info() if has_debug_info else None
+        return prototype
+
+    def constant(self) -> ConstRef:
+        number, kind = self.value(), next(self.constants)
+        if kind == CONST_CHILD:
+            ref = self.prototypes[next(self.constants)]
+        elif kind == CONST_TABLE:
+            array_count, dictionary_count = next(self.tables), next(self.tables)
+            ref = _new(Table)
+            ref.array = [self.value() for _ in range(array_count)]
+            ref.dictionary = [(self.value(), self.value()) for _ in range(dictionary_count)]
+        elif kind == CONST_COMPLEX:
+            ref = self.value(), self.value()
+        else:
+            ref = self.value()
+        return ConstRef(ref, number)
+
+    def value(self):
+        kind = next(self.kinds)
+        if kind == VALUE_STR:
+            return next(self.strings)
+        if kind == VALUE_INT:
+            return next(self.ints)
+        if kind == VALUE_FLOAT:
+            return next(self.floats)
+        return (None, False, True)[kind]
+
+    def debug_info(self) -> DebugInfo:
+        line_count, name_count, variable_count = next(self.debug), next(self.debug), next(self.debug)
+        debug_info = _new(DebugInfo)
+        debug_info.addr_to_line_map = self.columns['lines'][self.line_pos:self.line_pos + line_count]
+        self.line_pos += line_count
+        debug_info.upvalue_variable_names = [next(self.strings) for _ in range(name_count)]
+        debug_info.variable_infos = []
+        for _ in range(variable_count):
+            variable = _new(VariableInfo)
+            variable.start_addr, variable.end_addr, variable.type = next(self.debug), next(self.debug), next(self.debug)
+            variable.name = next(self.strings)
+            debug_info.variable_infos.append(variable)
+        return debug_info
+
+
+def to_bytes(dump: BytecodeDump) -> bytes:
+    payload = _Encoder().encode(dump)
+    return HEADER.pack(MAGIC, VERSION, LAYOUT, zlib.crc32(payload), len(payload)) + payload
+
+
+def from_bytes(data) -> BytecodeDump:
+    data = memoryview(data)
+    if len(data) < HEADER.size:
+        raise Exception("Truncated snapshot")
+    magic, version, layout, checksum, size = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise Exception("Invalid magic, not a dump snapshot")
+    if version != VERSION or layout != LAYOUT:
+        raise Exception("Snapshot version {0} ({1:08x}) not supported, expected {2} ({3:08x})".format(version, layout, VERSION, LAYOUT))
+    payload = data[HEADER.size:HEADER.size + size]
+    if len(payload) != size or zlib.crc32(payload) != checksum:
+        raise Exception("Snapshot checksum mismatch, file is truncated or corrupted")
+    # the restored object graph has no cycles, collecting while it is built only costs time
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return _Decoder(payload).decode()
+    except (StopIteration, IndexError, ValueError, UnicodeDecodeError):
+        raise Exception("Malformed snapshot payload")
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+def save(dump: BytecodeDump, filename):
+    data = to_bytes(dump)
+    if hasattr(filename, 'write'):
+        filename.write(data)
+    else:
+        with open(filename, 'wb') as fd:
+            fd.write(data)
+
+
+def load(filename) -> BytecodeDump:
+    if hasattr(filename, 'read'):
+        return from_bytes(filename.read())
+    with open(filename, 'rb') as fd:
+        return from_bytes(fd.read())
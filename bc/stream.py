@@ -1,9 +1,85 @@
 #!/usr/bin/env python
 # coding: utf-8
 import array
+import mmap
 import os
 import struct
 import sys
+from typing import List, Tuple
+
+
+ARRAY_TYPECODES = {1: 'B', 2: 'H', 4: 'I'}
+DOUBLE = struct.Struct('=d')
+
+
+def combine_float_words(lo, hi):
+    if sys.byteorder == 'big':
+        return lo << 32 | hi
+    else:
+        return hi << 32 | lo
+
+
+def assemble_floats(bits) -> List[float]:
+    """Reinterpret a sequence of 64 bit patterns as doubles in one step"""
+    return array.array('d', array.array('Q', bits).tobytes()).tolist()
+
+
+def decode_uleb128(buffer, pos, count) -> Tuple[List[int], int]:
+    """Decode count consecutive ULEB128 values from buffer, return values and the position after them"""
+    values = []
+    append = values.append
+    for _ in range(count):
+        value = buffer[pos]
+        pos += 1
+        if value >= 0x80:
+            value &= 0x7f
+            shift = 0
+            while True:
+                byte = buffer[pos]
+                pos += 1
+                shift += 7
+                value |= (byte & 0x7f) << shift
+                if byte < 0x80:
+                    break
+        append(value)
+    return values, pos
+
+
+def decode_uleb128_33(buffer, pos, count) -> Tuple[list, int]:
+    """
+    Decode count consecutive ULEB128_33 numbers (numeric constants) from buffer.
+    Integers are sign extended from 32 bits, floats are assembled together after decoding.
+    """
+    values = []
+    append = values.append
+    float_indices = []
+    float_bits = []
+    for index in range(count):
+        value = buffer[pos]
+        pos += 1
+        if value >= 0x80:
+            value &= 0x7f
+            shift = 0
+            while True:
+                byte = buffer[pos]
+                pos += 1
+                shift += 7
+                value |= (byte & 0x7f) << shift
+                if byte < 0x80:
+                    break
+
+        if value & 0x1:
+            (hi,), pos = decode_uleb128(buffer, pos, 1)
+            float_indices.append(index)
+            float_bits.append(combine_float_words(value >> 1, hi))
+            append(None)
+        else:
+            value >>= 1
+            append(value - 0x100000000 if value & 0x80000000 else value)
+
+    for index, value in zip(float_indices, assemble_floats(float_bits)):
+        values[index] = value
+    return values, pos
 
 
 class Stream(object):
@@ -26,19 +102,37 @@ class Stream(object):
     def close(self):
         self.fd.close()
 
+    def tell(self):
+        return self.fd.tell()
+
+    def seek(self, offset):
+        self.fd.seek(offset)
+
+    def skip(self, size):
+        self.fd.seek(size, os.SEEK_CUR)
+
+    def length(self):
+        pos = self.fd.tell()
+        end = self.fd.seek(0, os.SEEK_END)
+        self.fd.seek(pos)
+        return end
+
     def read_bytes(self, size=1):
         return self.fd.read(size)
 
+    def read_view(self, size):
+        return self.fd.read(size)
+
     def read_byte(self):
         data = self.fd.read(1)
         return int.from_bytes(data, byteorder=sys.byteorder, signed=False)
 
     def read_zstring(self):
-        string = b''
+        string = bytearray()
         while True:
             byte = self.read_bytes(1)
             if byte == b'\x00':
-                return string
+                return bytes(string)
             else:
                 string += byte
 
@@ -69,26 +163,34 @@ class Stream(object):
         else:
             return self._process_sign(lo)
 
+    def read_uleb128_array(self, count) -> List[int]:
+        return [self.read_uleb128() for _ in range(count)]
+
+    def read_uleb128_33_array(self, count) -> list:
+        return [self.read_uleb128_33() for _ in range(count)]
+
     def read_uint(self, size=4):
         value = self.read_bytes(size)
 
         return int.from_bytes(value, byteorder=self.byteorder, signed=False)
 
+    def read_uint_array(self, count, size=4) -> array.array:
+        """Read count unsigned ints of the given size in one go, converted to native byte order"""
+        values = array.array(ARRAY_TYPECODES[size])
+        values.frombytes(self.read_view(count * size))
+        if size > 1 and self.byteorder != sys.byteorder:
+            values.byteswap()
+        return values
+
     def read_float(self):
-        lo = self.read_uleb128()
-        hi = self.read_uleb128()
+        lo, hi = self.read_uleb128_array(2)
         return self._assemble_float(lo, hi)
 
     def read_signed_int(self):
         return self._process_sign(self.read_uleb128())
 
     def _assemble_float(self, lo, hi):
-        if sys.byteorder == 'big':
-            float_as_int = lo << 32 | hi
-        else:
-            float_as_int = hi << 32 | lo
-
-        return struct.unpack("=d", struct.pack("=Q", float_as_int))[0]
+        return DOUBLE.unpack(combine_float_words(lo, hi).to_bytes(8, sys.byteorder))[0]
 
     def _process_sign(self, number):
         if number & 0x80000000:
@@ -97,7 +199,7 @@ class Stream(object):
             return number
 
     def write_byte(self, b):
-        self.fd.write(bytes(chr(b), 'ascii'))
+        self.fd.write(bytes((b,)))
 
     def write_bytes(self, bs):
         self.fd.write(bs)
@@ -116,6 +218,13 @@ class Stream(object):
         value = int.to_bytes(value, size, byteorder=self.byteorder, signed=False)
         self.write_bytes(value)
 
+    def write_uint_array(self, values, size=4):
+        """Write unsigned ints of the given size in one go, values are given in native byte order"""
+        values = array.array(ARRAY_TYPECODES[size], values)
+        if size > 1 and self.byteorder != sys.byteorder:
+            values.byteswap()
+        self.write_bytes(values)
+
     def write_float(self, value):
         lo, hi = self._dissemble_float(value)
         self.write_uleb128(lo)
@@ -146,3 +255,174 @@ class Stream(object):
             lo, hi = self._dissemble_float(value)
             self.write_uleb128((lo << 1) | 1)
             self.write_uleb128(hi)
+
+
+class MemoryStream(Stream):
+    """
+    Read only stream over an in-memory buffer.
+    Files are memory mapped, bytes, bytearray and memoryview are used as is.
+    Values are decoded from a cursor over a memoryview, no file io per field.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.buffer: memoryview = None
+        self.data = None  # bytes, bytearray or mmap behind buffer, used for fast searching
+        self.pos = 0
+        self.mmap = None
+
+    @classmethod
+    def open(cls, filename, mode='rb'):
+        self = cls()
+        if isinstance(filename, (bytes, bytearray, memoryview)):
+            self.name = None
+            self.buffer = memoryview(filename).cast('B')
+            if not isinstance(filename, memoryview):
+                self.data = filename
+            return self
+
+        if hasattr(filename, 'read'):
+            self.name = None
+            self.fd = filename
+        else:
+            self.name = filename
+            self.fd = open(filename, mode)
+
+        try:
+            self.mmap = mmap.mmap(self.fd.fileno(), 0, access=mmap.ACCESS_READ)
+            self.data = self.mmap
+        except (AttributeError, OSError, ValueError):
+            # not a real file (e.g. BytesIO) or an empty file which can not be mapped
+            self.data = self.fd.read()
+        self.buffer = memoryview(self.data)
+        return self
+
+    def close(self):
+        if self.buffer is not None:
+            self.buffer.release()
+            self.buffer = None
+        self.data = None
+        if self.mmap is not None:
+            self.mmap.close()
+            self.mmap = None
+        if self.fd is not None:
+            self.fd.close()
+
+    def tell(self):
+        return self.pos
+
+    def seek(self, offset):
+        self.pos = offset
+
+    def skip(self, size):
+        self.pos += size
+
+    def length(self):
+        return len(self.buffer)
+
+    def read_bytes(self, size=1):
+        pos = self.pos
+        self.pos = pos + size
+        return self.buffer[pos:pos + size].tobytes()
+
+    def read_view(self, size):
+        """Zero-copy read, the returned view is only valid until the stream is closed"""
+        pos = self.pos
+        self.pos = pos + size
+        return self.buffer[pos:pos + size]
+
+    def read_byte(self):
+        value = self.buffer[self.pos]
+        self.pos += 1
+        return value
+
+    def read_zstring(self):
+        start = self.pos
+        if self.data is not None:
+            end = self.data.find(b'\x00', start)
+            if end < 0:
+                raise EOFError('Unterminated string at {}'.format(start))
+        else:
+            buffer = self.buffer
+            end = start
+            while buffer[end]:
+                end += 1
+        self.pos = end + 1
+        return self.buffer[start:end].tobytes()
+
+    def read_uleb128(self):
+        buffer = self.buffer
+        pos = self.pos
+        value = buffer[pos]
+        pos += 1
+
+        if value >= 0x80:
+            shift = 0
+            value &= 0x7f
+
+            while True:
+                byte = buffer[pos]
+                pos += 1
+
+                shift += 7
+                value |= (byte & 0x7f) << shift
+
+                if byte < 0x80:
+                    break
+
+        self.pos = pos
+        return value
+
+    def read_uleb128_array(self, count) -> List[int]:
+        values, self.pos = decode_uleb128(self.buffer, self.pos, count)
+        return values
+
+    def read_uleb128_33_array(self, count) -> list:
+        values, self.pos = decode_uleb128_33(self.buffer, self.pos, count)
+        return values
+
+    def read_uint(self, size=4):
+        pos = self.pos
+        self.pos = pos + size
+        return int.from_bytes(self.buffer[pos:pos + size], byteorder=self.byteorder, signed=False)
+
+
+class BufferStream(Stream):
+    """
+    Write only stream into an in-memory bytearray.
+    Nothing touches the file system, the collected data is written out in one go by the owner.
+    """
+
+    def __init__(self, byteorder=sys.byteorder):
+        super().__init__()
+        self.byteorder = byteorder
+        self.data = bytearray()
+
+    @classmethod
+    def open(cls, filename=None, mode='wb'):
+        return cls()
+
+    def close(self):
+        pass
+
+    def tell(self):
+        return len(self.data)
+
+    def getvalue(self) -> bytes:
+        return bytes(self.data)
+
+    def write_byte(self, b):
+        self.data.append(b)
+
+    def write_bytes(self, bs):
+        self.data += bs
+
+    def write_uleb128(self, value):
+        data = self.data
+        while value >= 0x80:
+            data.append(value & 0x7f | 0x80)
+            value >>= 7
+        data.append(value)
+
+    def write_uint(self, value, size=4):
+        self.data += value.to_bytes(size, byteorder=self.byteorder, signed=False)
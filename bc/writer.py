@@ -1,21 +1,37 @@
-from bc.data import Table, Prototype, BytecodeDump, Instruction, InsType, Const
-from bc.stream import Stream
+from array import array
+
+from bc.data import Table, Prototype, BytecodeDump, Const, instruction_operands
+from bc.codec import numpy, NUMPY_MIN_INSTRUCTIONS, join_codewords
+from bc.stream import BufferStream, ARRAY_TYPECODES
 
 
 class DumpWriter(object):
-    def __init__(self, dump: BytecodeDump, filename, encoding):
+    """
+    Serializes a BytecodeDump.
+    The dump is assembled in memory and written to the target with a single write.
+    Prototypes that still hold their raw body (Reader(keep_raw=True)) and did not change are copied as is,
+    unless the byte order or strip flag of the dump changed since it was read.
+    """
+
+    def __init__(self, dump: BytecodeDump, filename=None, encoding='utf-8'):
         self.dump = dump
         self.encoding = encoding
         self.filename = filename
-        self.stream: Stream = None
-        self.prototype_datas = {}
+        self.stream: BufferStream = None
 
     def write(self):
-        self.stream = Stream.open(self.filename, 'wb')
-        # self.stream = Stream.open(BytesIO())
+        data = self.write_to_bytes()
+        if hasattr(self.filename, 'write'):
+            self.filename.write(data)
+        else:
+            with open(self.filename, 'wb') as fd:
+                fd.write(data)
+
+    def write_to_bytes(self) -> bytes:
+        self.stream = BufferStream()
         self._write_header()
         self._write_prototypes()
-        self.stream.close()
+        return self.stream.getvalue()
 
     def _write_header(self):
         self.stream.write_bytes(Const.MAGIC)
@@ -28,69 +44,65 @@ class DumpWriter(object):
         self.stream.byteorder = 'big' if self.dump.is_big_endian else 'little'
 
     def _write_prototypes(self):
-        for prototype in self._sorted_prototypes():
-            self._write_prototype(prototype)
+        layout = self.dump.layout()
+        for prototype in self.dump.sorted_prototypes():
+            if prototype.raw_fits(layout):
+                data = prototype.raw
+            else:
+                data = self._encode(self._write_prototype, prototype)
+            self.stream.write_uleb128(len(data))
+            self.stream.write_bytes(data)
 
         # end of prototypes
         self.stream.write_uleb128(0)
 
+    def encode_prototype(self, prototype: Prototype) -> bytes:
+        """Encoded prototype body as it would be written, without the size prefix"""
+        if self.stream is None:
+            self.stream = BufferStream('big' if self.dump.is_big_endian else 'little')
+        return bytes(self._encode(self._write_prototype, prototype))
+
+    def _encode(self, write, prototype: Prototype) -> bytearray:
+        # sections prefixed with their size are encoded into a separate buffer first
+        stream = self.stream
+        self.stream = BufferStream(stream.byteorder)
+        try:
+            write(prototype)
+            return self.stream.data
+        finally:
+            self.stream = stream
+
     def _write_prototype(self, prototype: Prototype):
+        debug_info = b'' if self.dump.is_stripped else self._encode(self._write_debug_info, prototype)
         self.stream.write_byte(prototype.has_ffi | prototype.has_iloop | prototype.is_jit_disabled | prototype.has_sub_prototypes | prototype.is_variadic)
-        self._write_counts(prototype)
+        self._write_counts(prototype, len(debug_info))
         self._write_instructions(prototype)
         self._write_upvalues(prototype)
         self._write_constants(prototype)
         self._write_numerics(prototype)
-        self._write_debug_info(prototype)
+        self.stream.write_bytes(debug_info)
 
-    def _write_counts(self, prototype: Prototype):
-        self.stream.write_byte(len(prototype.argument_count))
+    def _write_counts(self, prototype: Prototype, debug_info_size):
+        self.stream.write_byte(prototype.argument_count)
         self.stream.write_byte(prototype.frame_size)
         self.stream.write_byte(len(prototype.upvalues))
         self.stream.write_uleb128(len(prototype.constants))
         self.stream.write_uleb128(len(prototype.numerics))
         self.stream.write_uleb128(len(prototype.instructions) - 1)
 
-        if prototype.debug_info_size > 0:
-            self.stream.write_uleb128(prototype.debug_info_size)
-            self.stream.write_uleb128(prototype.first_line_number)
-            self.stream.write_uleb128(prototype.line_count)
+        if not self.dump.is_stripped:
+            self.stream.write_uleb128(debug_info_size)
+            if debug_info_size > 0:
+                self.stream.write_uleb128(prototype.first_line_number)
+                self.stream.write_uleb128(prototype.line_count)
 
     def _write_instructions(self, prototype: Prototype):
-        for ins in prototype.instructions[1:]:  # ignore head
-            self._write_instruction(prototype, ins)
-
-    def _write_instruction(self, prototype: Prototype, ins: Instruction):
-        a, b, cd = 0, 0, 0
-        arg_count = 0
-        if ins.A_TYPE is not None:
-            a = self._process_operand(prototype, ins.A_TYPE, ins.a)
-            arg_count += 1
-        if ins.B_TYPE is not None:
-            b = self._process_operand(prototype, ins.B_TYPE, ins.b)
-            arg_count += 1
-        if ins.CD_TYPE is not None:
-            cd = self._process_operand(prototype, ins.CD_TYPE, ins.cd)
-            arg_count += 1
-        if arg_count == 3:
-            codeword = ins.OPCODE | (a << 8) | (b << 24) | (cd << 16)
-        else:
-            codeword = ins.OPCODE | (a << 8) | (cd << 16)
-        self.stream.write_uint(codeword)
-
-    def _process_operand(self, prototype: Prototype, operand_type, operand):
-        if operand_type in (InsType.STR, InsType.TAB, InsType.FUN, InsType.CDT):
-            return len(prototype.constants) - operand - 1
-        elif operand_type == InsType.JMP:
-            return operand + 0x8000
-        elif operand_type == InsType.NUM:
-            return operand
-        else:
-            return operand
+        # the head is skipped, it is implied by the prototype flags
+        operands = (sequence[1:] for sequence in instruction_operands(prototype.instructions))
+        self.stream.write_uint_array(join_codewords(*operands, len(prototype.constants) - 1))
 
     def _write_upvalues(self, prototype: Prototype):
-        for uv in prototype.upvalues:
-            self.stream.write_uint(uv, 2)
+        self.stream.write_uint_array(prototype.upvalues, 2)
 
     def _write_constants(self, prototype: Prototype):
         for c in prototype.constants:
@@ -112,6 +124,9 @@ class DumpWriter(object):
             # elif isinstance(ref, tuple):
             #     stream.write_uleb128(Const.BCDUMP_KGC_I64)
             #     stream.write_float(ref)
+            else:
+                # the reader keeps 64 bit integers as plain numbers, signed and unsigned can not be told apart
+                raise Exception("Cannot write cdata constant {0!r} of prototype {1}".format(ref, prototype.number))
 
     def _write_numerics(self, prototype: Prototype):
         for n in prototype.numerics:
@@ -167,8 +182,14 @@ class DumpWriter(object):
         else:
             line_info_size = 1
 
-        for v in prototype.debug_info.addr_to_line_map[1:]:
-            self.stream.write_uint(v - prototype.first_line_number, line_info_size)
+        lines = prototype.debug_info.addr_to_line_map[1:]
+        if numpy is not None and len(lines) >= NUMPY_MIN_INSTRUCTIONS:
+            lines = numpy.asarray(lines, dtype=numpy.int64) - prototype.first_line_number
+            line_deltas = array(ARRAY_TYPECODES[line_info_size])
+            line_deltas.frombytes(lines.astype(line_deltas.typecode).tobytes())
+        else:
+            line_deltas = [v - prototype.first_line_number for v in lines]
+        self.stream.write_uint_array(line_deltas, line_info_size)
 
     def _write_upvalue_names(self, prototype: Prototype):
         for v in prototype.debug_info.upvalue_variable_names:
@@ -187,16 +208,3 @@ class DumpWriter(object):
             self.stream.write_uleb128(info.end_addr - info.start_addr)
             last_addr = info.start_addr
         self.stream.write_byte(Const.VARNAME_END)
-
-    def _sorted_prototypes(self):
-        def get_prototypes(pt: Prototype):
-            children = []
-            for c in pt.constants:
-                if isinstance(c.ref, Prototype):
-                    children = get_prototypes(c.ref) + children
-            return children + [pt]
-
-        prototypes = []
-        for prototype in self.dump.prototypes:
-            prototypes.extend(get_prototypes(prototype))
-        return prototypes
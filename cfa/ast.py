@@ -449,3 +449,14 @@ class LoopBody(Statement):
 
 class Nop(Statement):
     pass
+
+
+class Disassembly(Statement):
+    """Listing of a function whose control flow cannot be structured, written in place of its statements"""
+
+    def __init__(self, reason: str, listing: str):
+        self.reason = reason
+        self.listing = listing
+
+    def __repr__(self):
+        return 'disassembly ({})'.format(self.reason)
@@ -1,21 +1,36 @@
 #!/usr/bin/env python
 # coding: utf-8
 from functools import reduce
+from io import StringIO
 from typing import List, Union
 
 from bc.data import Prototype, Instruction, Ins, InsType, Table
+from bc.disassembler import Disassembler
 from cfa.ast import UnExp, UN_OP, BinExp, BIN_OP, Upvalue, Constant, Literal, Primitive, TableConstructor, TableElement, MultiRes, \
-    Vararg, Assign, Return, FuncCall, Statement, ForInit, ForLoop, IterLoop, Slot, IterCall, FuncDef, Exp, ExpList, StatementList, LoopBody, Condition, MyList
-from cfa.graph import Block, Edge, Graph
+    Vararg, Assign, Return, FuncCall, Statement, ForInit, ForLoop, IterLoop, Slot, IterCall, FuncDef, Exp, ExpList, StatementList, LoopBody, Condition, MyList, \
+    Disassembly
+from cfa.dominator import DominatorTree
+from cfa.graph import BlockTable, Edge, Graph, Unstructurable
 from cfa.temporary import TemporaryEliminator, Transformer
+from log import logger
 
 
 class Builder(object):
-    def __init__(self, prototype: Prototype):
+    def __init__(self, prototype: Prototype, name=''):
         self.prototype = prototype
+        self.name = name  # chunk name of the dump, shown in the header of a fallback listing
+        self.pruned_instructions = 0  # unreachable instructions left out by build_graph()
 
     def build(self, is_root=False) -> FuncDef:
-        graph = self.build_graph()
+        if self.prototype.is_variadic:
+            args = ExpList(Vararg())
+        else:
+            args = ExpList([Slot(i) for i in range(self.prototype.argument_count)])
+
+        try:
+            graph = self.build_graph()
+        except Unstructurable as e:
+            return FuncDef(args, StatementList([self.build_disassembly(str(e))]), is_root)
         statements = StatementList(graph.root.statements)
 
         try:
@@ -28,13 +43,14 @@ class Builder(object):
             pass
 
         Transformer().visit(statements)
-
-        if self.prototype.is_variadic:
-            args = ExpList(Vararg())
-        else:
-            args = ExpList([Slot(i) for i in range(self.prototype.argument_count)])
         return FuncDef(args, statements, is_root)
 
+    def build_disassembly(self, reason: str) -> Disassembly:
+        """Fallback for a function which cannot be structured, its listing costs a single pass over the instructions"""
+        out = StringIO()
+        Disassembler(out, self.name).write_prototype(self.prototype)
+        return Disassembly(reason, out.getvalue())
+
     def build_graph(self) -> Graph:
         # split instructions to blocks
         leaders = {1}
@@ -53,31 +69,53 @@ class Builder(object):
 
         leaders = sorted(filter(None, list(leaders)))
         next_leaders = leaders[1:] + [len(self.prototype.instructions)]
-        blocks = []
+        ends = dict(zip(leaders, next_leaders))
+
+        # translate the blocks reachable from the first one only, dead code never becomes statements
+        statements = {}
+        targets = {}
+        stack = [leaders[0]]
+        while stack:
+            leader = stack.pop()
+            if leader in statements:
+                continue
+            statements[leader] = self.translate_statements(leader, ends[leader])
+            targets[leader] = self.find_targets(ends, ends[leader], statements[leader])
+            stack.extend(reversed([target for target, _ in targets[leader]]))
+
+        self.pruned_instructions = sum(ends[leader] - leader for leader in leaders if leader not in statements)
+        if self.pruned_instructions:
+            logger.debug('pruned {} unreachable instructions of prototype {}'.format(self.pruned_instructions, self.prototype.number))
+
+        table = BlockTable()
         leader_to_blocks = {}
-        for leader, next_leader in zip(leaders, next_leaders):
-            blocks.append(Block(self.translate_statements(leader, next_leader)))
-            leader_to_blocks[leader] = blocks[-1]
-
-        # build block edges
-        for i, block in enumerate(blocks):
-            addr = next_leaders[i] - 1
-            ins = self.prototype.instructions[addr]
-            if Ins.ISLT.OPCODE <= ins.OPCODE <= Ins.ISF.OPCODE:
-                block.succ.append(Edge(leader_to_blocks[addr + 1], True))  # if true goto next instruction
-                block.succ.append(Edge(leader_to_blocks[addr + 2], False))  # if false goto the instruction after next
-            elif isinstance(ins, (Ins.UCLO, Ins.ISNEXT, Ins.JMP)) and ins.cd != 0:  # only branch if target is not 0
-                block.succ.append(Edge(leader_to_blocks[addr + ins.cd + 1]))  # unconditional jump
-            elif Ins.FORI.OPCODE <= ins.OPCODE <= Ins.JITERL.OPCODE and ins.cd != 0:  # only branch if target is not 0
-                block.succ.append(Edge(leader_to_blocks[addr + ins.cd + 1], True))  # if true goto jump
-                block.succ.append(Edge(leader_to_blocks[addr + 1], False))  # if false goto next instruction.
-            elif next_leaders[i] in leader_to_blocks:
-                block.succ.append(Edge(leader_to_blocks[next_leaders[i]]))  # flow
-
-            if block.statements and isinstance(block.statements[-1], Return):
-                block.succ = []
-
-        return Graph(blocks[0])
+        for leader in leaders:
+            if leader in statements:
+                leader_to_blocks[leader] = table.new_block(statements[leader])
+        for leader, block in leader_to_blocks.items():
+            table.set_succ(block, [Edge(leader_to_blocks[target], condition) for target, condition in targets[leader]])
+        root = leader_to_blocks[leaders[0]]
+
+        # a loop entered other than through its header never reduces to a single block, the patterns only build single entry loops
+        if not DominatorTree(root).is_reducible():
+            raise Unstructurable('control flow is not reducible')
+        return Graph(root, table)
+
+    def find_targets(self, ends, end, statements: List[Statement]) -> List[tuple]:
+        """(leader, edge condition) of each successor of the block which ends before end"""
+        if statements and isinstance(statements[-1], Return):
+            return []
+        addr = end - 1
+        ins = self.prototype.instructions[addr]
+        if Ins.ISLT.OPCODE <= ins.OPCODE <= Ins.ISF.OPCODE:
+            return [(addr + 1, True), (addr + 2, False)]  # if true goto next instruction, if false goto the instruction after next
+        elif isinstance(ins, (Ins.UCLO, Ins.ISNEXT, Ins.JMP)) and ins.cd != 0:  # only branch if target is not 0
+            return [(addr + ins.cd + 1, None)]  # unconditional jump
+        elif Ins.FORI.OPCODE <= ins.OPCODE <= Ins.JITERL.OPCODE and ins.cd != 0:  # only branch if target is not 0
+            return [(addr + ins.cd + 1, True), (addr + 1, False)]  # if true goto jump, if false goto next instruction
+        elif end in ends:
+            return [(end, None)]  # flow
+        return []
 
     def translate_statements(self, start, end) -> List[Statement]:
         statements = []
@@ -119,7 +157,7 @@ class Builder(object):
             return Assign(ExpList(self.build_operand(ins.A_TYPE, ins.a)), ExpList(self.build_operand(ins.CD_TYPE, ins.cd)))
 
         if isinstance(ins, Ins.FNEW):
-            return Assign(ExpList(Slot(ins.a)), ExpList(Builder(self.prototype.constants[ins.cd].ref).build()))
+            return Assign(ExpList(Slot(ins.a)), ExpList(Builder(self.prototype.constants[ins.cd].ref, self.name).build()))
 
         if isinstance(ins, Ins.TNEW):
             return Assign(ExpList(Slot(ins.a)), ExpList(TableConstructor()))
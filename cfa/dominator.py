@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+# coding: utf-8
+from typing import List, Dict, Set, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from cfa.graph import Block
+
+
+class DominatorTree(object):
+    """
+    Immediate dominators of the blocks reachable from root.
+    Cooper, Harvey and Kennedy's iterative algorithm over the reverse postorder
+    """
+
+    def __init__(self, root: 'Block'):
+        self.root = root
+        self.order: List[Block] = []  # postorder
+        self.number: Dict[Block, int] = {}  # postorder index
+        self.pred: Dict[Block, List[Block]] = {root: []}
+        self.retreating: List[tuple] = []  # (tail, head) of edges to a block on the dfs stack
+        self.idom: Dict[Block, Block] = {}
+        self.children: Dict[Block, List[Block]] = {}
+        self.interval: Dict[Block, tuple] = {}  # (enter, leave) numbers of a walk over the tree
+
+        self._walk()
+        self._build()
+        self._number()
+
+    def _walk(self):
+        on_stack = {self.root}
+        stack = [(self.root, iter(self.root.successors()))]
+        while stack:
+            block, succ = stack[-1]
+            for tail in succ:
+                if tail not in self.pred:
+                    self.pred[tail] = [block]
+                    on_stack.add(tail)
+                    stack.append((tail, iter(tail.successors())))
+                    break
+                self.pred[tail].append(block)
+                if tail in on_stack:
+                    self.retreating.append((block, tail))
+            else:
+                stack.pop()
+                on_stack.discard(block)
+                self.number[block] = len(self.order)
+                self.order.append(block)
+
+    def _build(self):
+        number = self.number
+        idom = self.idom
+        idom[self.root] = self.root
+
+        def intersect(a, b):
+            while a is not b:
+                while number[a] < number[b]:
+                    a = idom[a]
+                while number[b] < number[a]:
+                    b = idom[b]
+            return a
+
+        changed = True
+        while changed:
+            changed = False
+            for block in reversed(self.order[:-1]):
+                new = None
+                for pred in self.pred[block]:
+                    if pred in idom:
+                        new = pred if new is None else intersect(pred, new)
+                if idom.get(block) is not new:
+                    idom[block] = new
+                    changed = True
+
+    def _number(self):
+        for block in self.order:
+            self.children[block] = []
+        for block, parent in self.idom.items():
+            if block is not self.root:
+                self.children[parent].append(block)
+        counter = 0
+        stack = [(self.root, False)]
+        enter = {}
+        while stack:
+            block, leaving = stack.pop()
+            if leaving:
+                self.interval[block] = (enter[block], counter)
+            else:
+                enter[block] = counter
+                stack.append((block, True))
+                stack.extend((child, False) for child in self.children[block])
+            counter += 1
+
+    def dominates(self, a: 'Block', b: 'Block') -> bool:
+        """True if every path from the root to b passes a, blocks dominate themselves"""
+        enter, leave = self.interval[a]
+        return enter <= self.interval[b][0] and self.interval[b][1] <= leave
+
+    def is_reducible(self) -> bool:
+        """True if the head of every retreating edge dominates its tail, so every loop has a single entry"""
+        return all(self.dominates(head, tail) for tail, head in self.retreating)
+
+
+class Loop(object):
+    def __init__(self, header: 'Block', latch: 'Block'):
+        self.header = header  # dominates every block of the loop
+        self.latch = latch  # tail of the back edge which closes the loop
+        self.blocks: Set[Block] = {header}  # including the blocks of inner loops
+        self.parent: Loop = None
+
+    def __repr__(self):
+        return 'Loop({}, {}, {} blocks)'.format(self.header, self.latch, len(self.blocks))
+
+
+class LoopForest(object):
+    """
+    Loop nesting forest of a reducible graph.
+    An edge is a back edge if its head dominates its tail, each back edge closes the natural loop of the blocks which reach
+    its tail without passing its head. Loops sharing a header are kept apart, LuaJIT emits them for a loop which starts
+    with another loop, they nest by size.
+    """
+
+    def __init__(self, dominators: DominatorTree):
+        self.dominators = dominators
+        self.loops: Dict[Block, List[Loop]] = {}  # header -> loops closed by its back edges, smallest first
+        self.innermost: Dict[Block, Loop] = {}  # block -> innermost loop containing it
+        self._find()
+
+    def _find(self):
+        dominators = self.dominators
+        # inner headers are dominated by the outer ones, so they finish first in postorder
+        for header in dominators.order:
+            loops = []
+            for latch in dominators.pred[header]:
+                if dominators.dominates(header, latch):
+                    loop = Loop(header, latch)
+                    stack = [latch]
+                    while stack:
+                        block = stack.pop()
+                        if block not in loop.blocks:
+                            loop.blocks.add(block)
+                            stack.extend(dominators.pred[block])
+                    loops.append(loop)
+            if not loops:
+                continue
+            loops.sort(key=lambda loop: len(loop.blocks))
+            self.loops[header] = loops
+            for loop in loops:
+                for block in loop.blocks:
+                    inner = self.innermost.get(block)
+                    if inner is None:
+                        self.innermost[block] = loop
+                        continue
+                    while inner.parent is not None and inner.parent is not loop:
+                        inner = inner.parent
+                    if inner is not loop:
+                        inner.parent = loop
+
+    def __contains__(self, block: 'Block'):
+        return block in self.dominators.number
+
+    def is_back_edge(self, tail: 'Block', head: 'Block') -> bool:
+        """True if the edge tail -> head closes a loop, head dominates tail"""
+        return self.dominators.dominates(head, tail)
+
+    def loops_through(self, header: 'Block', block: 'Block') -> List[Loop]:
+        """The loops of header which are closed through block, block dominates their latches"""
+        dominates = self.dominators.dominates
+        return [loop for loop in self.loops.get(header, ()) if dominates(block, loop.latch)]
@@ -1,33 +1,60 @@
 #!/usr/bin/env python
 # coding: utf-8
 import os
-from collections import defaultdict
-from typing import List, Iterable, Any, Dict
+from array import array
+from typing import List, Iterable, Iterator, Any, Dict, Callable
 
-from bc.reader import Sequence
+from cfa.dominator import DominatorTree, LoopForest, Loop
 from cfa.ast import Statement, ForLoop, IterLoop, Decision, Repeat, While, ForIn, Break, For, ForInit, If, BinCondition, IterCall, StatementList, Nop, LoopBody, Return, Condition, Primitive, UnExp
 from log import logger
 
-block_index = Sequence()
+
+class Unstructurable(Exception):
+    """Raised while building the graph of a function whose control flow the structuring patterns do not reduce"""
+
+
+CONDITIONS = (None, False, True)  # edge condition of each flag
+
+
+def flag(condition) -> int:
+    """Flag of an edge condition, see CONDITIONS"""
+    return 0 if condition is None else 2 if condition else 1
 
 
 class Block(object):
-    def __init__(self, statements: List[Statement]):
-        self.index = block_index.next()  # unique id
+    """A view of one block of a BlockTable, which holds its successors"""
+    __slots__ = ('index', 'statements', 'table')
+
+    def __init__(self, statements: List[Statement], index: int, table: 'BlockTable'):
+        self.index = index  # id in table
         self.statements: List[Statement] = statements
-        self.succ: List[Edge] = []  # successors
+        self.table = table
+
+    @property
+    def succ(self) -> List['Edge']:
+        """Out edges, built from the table on each access, replace them through Graph.set_succ()"""
+        blocks = self.table.blocks
+        return [Edge(blocks[t], CONDITIONS[f]) for t, f in zip(self.table.tails[self.index], self.table.flags[self.index])]
+
+    def successors(self) -> List['Block']:
+        """Tails of the out edges, in edge order"""
+        blocks = self.table.blocks
+        return [blocks[t] for t in self.table.tails[self.index]]
 
     def find_succ(self, condition):
         # type: (Any) -> Block
-        for edge in self.succ:
-            if edge.condition is condition:
-                return edge.tail
+        f = flag(condition)
+        for t, g in zip(self.table.tails[self.index], self.table.flags[self.index]):
+            if g == f:
+                return self.table.blocks[t]
 
     def __repr__(self):
         return 'Block({})'.format(self.index)
 
 
 class Edge(object):
+    __slots__ = ('tail', 'condition')
+
     def __init__(self, tail: Block, condition=None):
         self.tail = tail
         self.condition = condition
@@ -36,58 +63,357 @@ class Edge(object):
         return 'Edge({}, {})'.format(self.tail.index, self.condition)
 
 
+class BlockTable(object):
+    """
+    The blocks of a function and their successor edges, shared with the graphs of nested statements.
+    Blocks are dense integer ids, the out edges of each id are a typed array of successor ids with a parallel array of condition flags
+    """
+
+    def __init__(self):
+        self.blocks: List[Block] = []  # block of each id
+        self.tails: List[array] = []  # successor ids of each id
+        self.flags: List[array] = []  # condition flags of each id, parallel to tails
+
+    def new_block(self, statements: List[Statement]) -> Block:
+        block = Block(statements, len(self.blocks), self)
+        self.blocks.append(block)
+        self.tails.append(array('l'))
+        self.flags.append(array('b'))
+        return block
+
+    def set_succ(self, block: Block, edges: Iterable[Edge]):
+        """Replace the out edges of block, Graph.set_succ() keeps the predecessors of a graph in step"""
+        edges = list(edges)
+        self.tails[block.index] = array('l', [e.tail.index for e in edges])
+        self.flags[block.index] = array('b', [flag(e.condition) for e in edges])
+
+    def set_tail(self, block: Block, k: int, tail: Block) -> Block:
+        """Point the k-th out edge of block to tail, returns the previous tail"""
+        tails = self.tails[block.index]
+        old = self.blocks[tails[k]]
+        tails[k] = tail.index
+        return old
+
+
+class Predecessors(object):
+    """
+    Predecessor edges of the blocks of a graph, by the ids of their BlockTable.
+    The in edges of each id are a typed array of predecessor ids with a parallel array of condition flags
+    """
+
+    EMPTY = array('l')
+
+    def __init__(self, table: BlockTable):
+        self.blocks = table.blocks  # block of each id
+        self.tails: List[array] = []  # predecessor ids of each id, None for ids without in edges so far
+        self.flags: List[array] = []  # condition flags of each id, parallel to tails
+
+    def add(self, block: Block, tail: Block, f: int):
+        """Record the edge tail -> block with condition flag f"""
+        i = block.index
+        if i >= len(self.tails):
+            grow = [None] * (i + 1 - len(self.tails))
+            self.tails.extend(grow)
+            self.flags.extend(grow)
+        if self.tails[i] is None:
+            self.tails[i] = array('l')
+            self.flags[i] = array('b')
+        self.tails[i].append(tail.index)
+        self.flags[i].append(f)
+
+    def remove(self, block: Block, tail: Block, f: int):
+        """Remove one edge tail -> block with condition flag f"""
+        i = block.index
+        t = tail.index
+        tails = self.ids_of(block)
+        for k in range(len(tails)):
+            if tails[k] == t and self.flags[i][k] == f:
+                del tails[k]
+                del self.flags[i][k]
+                return
+        raise Exception('{} is not a predecessor of {}'.format(tail, block))
+
+    def remove_all(self, block: Block, tail: Block):
+        """Remove every edge tail -> block"""
+        i = block.index
+        t = tail.index
+        tails = self.ids_of(block)
+        if t in tails:
+            flags = self.flags[i]
+            keep = [k for k in range(len(tails)) if tails[k] != t]
+            self.tails[i] = array('l', [tails[k] for k in keep])
+            self.flags[i] = array('b', [flags[k] for k in keep])
+
+    def ids_of(self, block: Block) -> array:
+        """Predecessor ids of block, once per in edge"""
+        i = block.index
+        tails = self.tails[i] if i < len(self.tails) else None
+        return self.EMPTY if tails is None else tails
+
+    def count(self, block: Block) -> int:
+        """Number of in edges of block"""
+        return len(self.ids_of(block))
+
+    def of(self, block: Block) -> List[Block]:
+        """Predecessors of block, once per in edge"""
+        blocks = self.blocks
+        return [blocks[t] for t in self.ids_of(block)]
+
+    def with_condition(self, block: Block, condition) -> List[Block]:
+        """Predecessors of block through edges with the given condition"""
+        tails = self.ids_of(block)
+        if not tails:
+            return []
+        blocks = self.blocks
+        f = flag(condition)
+        return [blocks[t] for t, g in zip(tails, self.flags[block.index]) if g == f]
+
+    def conditions(self, block: Block) -> List[Any]:
+        """Conditions of the in edges of block"""
+        if not self.ids_of(block):
+            return []
+        return [CONDITIONS[f] for f in self.flags[block.index]]
+
+
+class Pattern(object):
+    """
+    A structuring pattern with its results cached per block.
+    A block is evaluated again only after its neighborhood changed, see Graph.requeue()
+    """
+
+    def __init__(self, func: Callable[[Block], Any], is_volatile: Callable[[Block], bool] = None):
+        self.func = func
+        self.is_volatile = is_volatile  # result depends on the whole graph, such blocks are evaluated on every scan
+        self.dirty: Dict[Block, None] = {}  # ordered set of blocks to evaluate
+        self.matches: Dict[Block, None] = {}  # blocks the pattern matched, or raised on, when last evaluated
+        self.volatile: Dict[Block, None] = {}
+
+
 class Graph(object):
-    def __init__(self, root: Block):
+    def __init__(self, root: Block, table: BlockTable):
         self.root = root
-        self.pred: Dict[Block, List[Edge]] = defaultdict(list)
+        self.table = table  # blocks of the function, shared with the graphs of nested statements
+        self.pred = Predecessors(table)
+        self.block_order: List[Block] = None  # cached result of blocks(), None after the graph changed
+        self.block_number: Dict[Block, int] = None  # index of each block in block_order
+        # successors each live block is recorded under in pred, live blocks are the blocks reachable from root
+        self.linked: Dict[Block, List[Block]] = {}
+        self.orphans: List[Block] = []  # blocks which lost a predecessor since the last commit()
+        self.changed: Dict[Block, None] = {}  # blocks whose statements, successors or predecessors changed
+        self.unsimplified: Dict[Block, None] = {}  # merged blocks whose predecessors are checked by the next simplify()
+        self.loops: LoopForest = None  # loop forest of the reachable blocks, built on demand
+        self.loop_bodies: List[Block] = []  # blocks starting with LoopBody, what construct_loop asks the loops about
 
         self.construct()
 
     def blocks(self) -> Iterable[Block]:
+        """Reachable blocks in depth first preorder, cached until invalidate() is called"""
+        if self.block_order is None:
+            self.block_order = list(self.walk())
+            self.block_number = {b: i for i, b in enumerate(self.block_order)}
+        return self.block_order
+
+    def walk(self) -> Iterator[Block]:
+        """
+        Depth first preorder from the root, same order as blocks().
+        The successors of a block are read when the walk moves on from it, so the caller may change them meanwhile
+        """
         visited = set()
         stack = [self.root]
         while stack:
-            block: Block = stack.pop(0)
+            block: Block = stack.pop()
             if block in visited:
                 continue
             yield block
             visited.add(block)
-            stack = [e.tail for e in block.succ if e.tail not in visited] + stack
+            stack.extend(reversed([tail for tail in block.successors() if tail not in visited]))
+
+    def new_block(self, statements: List[Statement]) -> Block:
+        return self.table.new_block(statements)
+
+    def invalidate(self):
+        """Call after changing blocks or edges"""
+        self.block_order = None
 
     def construct(self):
-        self.simplify()
-        changed = True
-        while changed:
-            changed = False
-            for func in [self.collapse_condition, self.construct_loop, self.construct_if]:
-                changed = changed or self.apply(func)
-        if self.root.succ:
-            raise Exception('Cannot be simplified')
-
-    def apply(self, func):
-        changed = True
-        while changed:
-            changed = False
-            op = None
-            for block in self.blocks():
-                op = func(block)
+        """
+        Rewrite the graph until a single block is left.
+        Every step applies the first pattern that matches anywhere, at the first matching block in preorder.
+        Pattern results are cached per block, after a rewrite only the blocks around the changed ones are evaluated again.
+        """
+        self.link(self.root)
+        self.simplify(list(self.linked))
+        self.loop_bodies = [b for b in self.linked if b.statements and isinstance(b.statements[0], LoopBody)]
+        patterns = [
+            Pattern(self.collapse_condition),
+            Pattern(self.construct_loop, self.has_ambiguous_pred),
+            Pattern(self.construct_if),
+        ]
+        self.requeue(patterns)
+        while True:
+            for pattern in patterns:
+                op = self.match(pattern)
                 if op:
                     break
-            # move any operation that will change cfg out block iterator
-            if op:
-                op[0](*op[1])
-                self.simplify()
-                changed = True
+            else:
                 break
-        return changed
+            op[0](*op[1])
+            self.commit()
+            self.simplify(list(self.changed))
+            self.requeue(patterns)
+        if self.root.successors():
+            raise Unstructurable('control flow cannot be simplified')
+
+    def match(self, pattern: Pattern):
+        """Operation of the first block in preorder the pattern matches, None if there is none"""
+        for block in pattern.dirty:
+            if block not in self.linked:
+                continue
+            if pattern.is_volatile and pattern.is_volatile(block):
+                pattern.volatile[block] = None
+                pattern.matches.pop(block, None)
+                continue
+            pattern.volatile.pop(block, None)
+            try:
+                matched = pattern.func(block)
+            except AssertionError:
+                # a pattern refusing the shape of the graph, raised again when the scan below reaches the block,
+                # as a full scan would. Other errors are bugs and raised right away
+                matched = True
+            if matched:
+                pattern.matches[block] = None
+            else:
+                pattern.matches.pop(block, None)
+        pattern.dirty.clear()
+
+        if not pattern.matches and not pattern.volatile:
+            return None
+        for block in self.walk() if self.block_order is None else self.block_order:
+            if block in pattern.matches or block in pattern.volatile:
+                op = pattern.func(block)
+                if op:
+                    return op
+                pattern.matches.pop(block, None)
+        # whatever is left is not reachable any more
+        pattern.matches.clear()
+        pattern.volatile.clear()
+        return None
+
+    def requeue(self, patterns: List[Pattern]):
+        """Queue the changed blocks and their neighborhoods, which the patterns read, for evaluation"""
+        queue = {}
+        for block in self.changed:
+            if block not in self.linked:
+                continue
+            queue[block] = None
+            for pred in self.pred.of(block):
+                queue[pred] = None
+            for tail in block.successors():
+                queue[tail] = None
+                for pred in self.pred.of(tail):
+                    queue[pred] = None
+        self.changed.clear()
+        for pattern in patterns:
+            pattern.dirty.update(queue)
+
+    def touch(self, *blocks: Block):
+        """Record blocks whose statements changed"""
+        for block in blocks:
+            self.changed[block] = None
+
+    def set_succ(self, block: Block, edges: List[Edge]):
+        """Replace the successors of block, pred follows in O(degree)"""
+        if block in self.linked:
+            self.unlink(block)
+            self.table.set_succ(block, edges)
+            self.link(block)
+        else:
+            self.table.set_succ(block, edges)
+
+    def redirect(self, block: Block, k: int, tail: Block):
+        """Point the k-th out edge of block to another tail, pred follows in O(degree)"""
+        old = self.table.set_tail(block, k, tail)
+        self.changed[block] = None
+        if block in self.linked:
+            self.linked[block][k] = tail
+            f = self.table.flags[block.index][k]
+            self.pred.remove(old, block, f)
+            self.orphans.append(old)
+            self.changed[old] = None
+            if self.add_pred(block, tail, f):
+                self.link(tail)
+
+    def merge_blocks(self, block: Block, merged: Block):
+        """Append merged, the single successor of block, to block"""
+        block.statements += merged.statements
+        edges = merged.succ
+        self.unlink(merged)
+        self.set_succ(block, edges)
+
+    def detach(self, blocks: Iterable[Block]):
+        """Cut blocks off the graph, those which turn out to be reachable otherwise are kept"""
+        blocks = list(blocks)
+        for block in blocks:
+            if block in self.linked:
+                self.unlink(block)
+        revived = [b for b in blocks if b not in self.linked and (b is self.root or self.pred.count(b))]
+        for block in revived:
+            self.link(block)
+        if revived:
+            # the detached blocks may hold a cycle which is only reachable from itself now
+            self.sweep()
+
+    def commit(self):
+        """Drop the blocks which lost their last predecessor during a rewrite, call after each rewrite"""
+        orphans = self.orphans
+        while orphans:
+            block = orphans.pop()
+            if block in self.linked and block is not self.root and not self.pred.count(block):
+                self.unlink(block)
+        self.invalidate()
+
+    def sweep(self):
+        """Unlink every block which is not reachable from the root"""
+        live = set(self.walk())
+        for block in [b for b in self.linked if b not in live]:
+            self.unlink(block)
+        self.reset_loops()
+
+    def link(self, block: Block):
+        """Add the out edges of block to pred, together with blocks which become reachable through them"""
+        stack = [block]
+        while stack:
+            block = stack.pop()
+            tails = self.linked[block] = block.successors()
+            self.changed[block] = None
+            for tail, f in zip(tails, self.table.flags[block.index]):
+                if self.add_pred(block, tail, f):
+                    stack.append(tail)
+
+    def add_pred(self, block: Block, tail: Block, f: int) -> bool:
+        """Record the edge block -> tail with condition flag f in pred, True if tail was not linked yet"""
+        self.pred.add(tail, block, f)
+        self.changed[tail] = None
+        if tail not in self.linked:
+            self.linked[tail] = []
+            return True
+        return False
+
+    def unlink(self, block: Block):
+        """Remove the out edges of block from pred, commit() checks its successors for reachability"""
+        for tail in self.linked.pop(block):
+            self.pred.remove_all(tail, block)
+            self.changed[tail] = None
+            self.orphans.append(tail)
+        self.changed[block] = None
 
     def construct_loop(self, block: Block):
         true: Block = block.find_succ(True)
         false: Block = block.find_succ(False)
 
         if isinstance(block.statements[-1], ForLoop):
-            assert len(self.pred[true]) == 2  # loop body can have only 2 in edges
-            head = list(filter(lambda e: e.tail != block, self.pred[true]))[0].tail
+            assert self.pred.count(true) == 2  # loop body can have only 2 in edges
+            head = [p for p in self.pred.of(true) if p is not block][0]
             return self.build_loop, ('for', block, head, true, head.find_succ(True))
 
         if isinstance(block.statements[-1], ForInit) and isinstance(false.statements[-1], Return):
@@ -98,44 +424,76 @@ class Graph(object):
             return self.build_loop, ('iter', block, block, true, false)
 
         if isinstance(block.statements[0], LoopBody):
+            # the condition heads a loop around the body
             cond = self.find_pred(block, False)
-            if cond and isinstance(cond.statements[-1], Decision) and cond.statements[-1].addr < block.statements[0].addr and self.has_path(block, cond):
+            if cond and isinstance(cond.statements[-1], Decision) and self.forest(cond, block).loops_through(cond, block):
                 return self.build_loop, ('while', cond, cond, block, cond.find_succ(True))
 
+            # the condition jumps back to the body
             cond = self.find_pred(block, True)
-            if cond and isinstance(cond.statements[-1], Decision) and cond.statements[-1].addr > block.statements[0].addr and self.has_path(block, cond):
+            if cond and isinstance(cond.statements[-1], Decision) and self.forest(cond, block).is_back_edge(cond, block):
                 return self.build_loop, ('repeat', cond, block, block, cond.find_succ(False))
 
-            for pred in self.pred[block]:
-                if pred.condition is None:
-                    if pred.tail and pred.tail.statements[-1].addr > block.statements[0].addr and self.has_path(block, pred.tail):
-                        return self.build_loop, ('while_true', block, block, block, None)
+            for pred in self.pred.with_condition(block, None):
+                if self.forest(pred, block).is_back_edge(pred, block):
+                    return self.build_loop, ('while_true', block, block, block, None)
 
     def find_pred(self, block: Block, cond) -> Block:
-        for e in self.pred[block]:
-            if e.condition is cond:
-                return e.tail
-
-    def has_path(self, src: Block, dst: Block):
-        stack = [src]
-        visited = set()
-
-        while stack:
-            block = stack.pop(0)
-            if block in visited:
-                continue
-            visited.add(block)
-            if block == dst:
-                return True
-            stack.extend([e.tail for e in block.succ if e.tail not in visited])
-
+        """The first predecessor in preorder with the given edge condition"""
+        preds = self.pred.with_condition(block, cond)
+        if len(preds) > 1:
+            self.blocks()
+            return min(preds, key=self.block_number.get)
+        return preds[0] if preds else None
+
+    def has_ambiguous_pred(self, block: Block) -> bool:
+        """True if find_pred() has to pick between predecessors of a loop body by preorder, which any rewrite may change"""
+        if block.statements and isinstance(block.statements[0], LoopBody):
+            conditions = [c for c in self.pred.conditions(block) if c is not None]
+            return len(conditions) != len(set(conditions))
         return False
 
+    def forest(self, *blocks: Block) -> LoopForest:
+        """
+        The loops of the graph, built again if one of blocks is not part of them.
+        Otherwise the forest is kept across rewrites, see reset_loops() for why its answers stay valid
+        """
+        if self.loops is None or not all(block in self.loops for block in blocks):
+            self.loops = LoopForest(DominatorTree(self.root))
+        return self.loops
+
+    def closing_loops(self, loop_type, loop: Block, entry: Block, body: Block) -> List[Loop]:
+        """The loops of the forest which make up the loop about to be built, read before its back edges are cut"""
+        forest = self.forest(loop, entry, body)
+        if loop_type in {'while', 'iter'}:
+            return forest.loops_through(entry, body)
+        if loop_type in {'for', 'repeat'}:
+            latches = [loop]
+        else:
+            latches = [p for p in self.pred.with_condition(body, None) if forest.is_back_edge(p, body)]
+        # loops sharing the header are sorted by size, a latch closes the smallest one containing it
+        loops = {}
+        for latch in latches:
+            closed = next((l for l in forest.loops.get(body, ()) if latch in l.blocks), None)
+            if closed:
+                loops[closed] = None
+        return list(loops)
+
+    def reset_loops(self):
+        """
+        Drop the loops after blocks cut off by a rewrite turned out to be reachable.
+        Otherwise a rewrite keeps which of the remaining blocks dominate and reach each other, the paths through
+        a built region now take the edges from its entry to its exits, so the loops stay valid for distinct blocks
+        """
+        self.loops = None
+        for block in self.loop_bodies:
+            self.changed[block] = None
+
     def collapse_condition(self, root):
-        if len(root.succ) == 2 and isinstance(root.statements[-1], Decision):
+        if len(root.successors()) == 2 and isinstance(root.statements[-1], Decision):
             true: Block = root.find_succ(True)
             false: Block = root.find_succ(False)
-            if isinstance(false.statements[-1], Decision) and len(self.pred[false]) == 1 and not isinstance(false.statements[0], LoopBody):
+            if isinstance(false.statements[-1], Decision) and self.pred.count(false) == 1 and not isinstance(false.statements[0], LoopBody):
                 if false.find_succ(True) is true:
                     logger.trace('{} R or F -> T, Ff'.format(root))
                     return self.merge_decision, (root, false, 'or', [Edge(true, True), Edge(false.find_succ(False), False)])
@@ -144,7 +502,7 @@ class Graph(object):
                     logger.trace('{} not R and F -> Ft, T'.format(root))
                     return self.merge_decision, (root, false, 'and', [Edge(false.find_succ(True), True), Edge(true, False)], True)
 
-            if isinstance(true.statements[-1], Decision) and len(self.pred[true]) == 1 and not isinstance(true.statements[0], LoopBody):
+            if isinstance(true.statements[-1], Decision) and self.pred.count(true) == 1 and not isinstance(true.statements[0], LoopBody):
                 if true.find_succ(True) is false:
                     logger.trace('{} not R or T -> F, Tf'.format(root))
                     return self.merge_decision, (root, true, 'or', [Edge(false, True), Edge(true.find_succ(False), False)], True)
@@ -154,45 +512,45 @@ class Graph(object):
                     return self.merge_decision, (root, true, 'and', [Edge(true.find_succ(True), True), Edge(false, False)])
 
     def construct_if(self, block: Block):
-        if len(block.succ) == 2 and isinstance(block.statements[-1], Decision):
+        if len(block.successors()) == 2 and isinstance(block.statements[-1], Decision):
             true = block.find_succ(True)
             false = block.find_succ(False)
             if true == false:
-                nothing = Block([Nop()])
+                nothing = self.new_block([Nop()])
                 return self.build_decision, (block, nothing, None, true)
-            if len(true.succ) == 1 and len(self.pred[true]) == 1 and true.succ[0].tail is false:
+            if len(true.successors()) == 1 and self.pred.count(true) == 1 and true.successors()[0] is false:
                 logger.debug('if true')
                 return self.build_decision, (block, true, None, false)
 
-            if len(false.succ) == 1 and len(self.pred[false]) == 1 and false.succ[0].tail is true:
+            if len(false.successors()) == 1 and self.pred.count(false) == 1 and false.successors()[0] is true:
                 logger.debug('if false')
                 return self.build_decision, (block, false, None, true, True)
 
-            if len(true.succ) == 1 and len(false.succ) == 1 and len(self.pred[true]) == 1 and len(self.pred[false]) == 1 and true.succ[0].tail is false.succ[0].tail:
+            if len(true.successors()) == 1 and len(false.successors()) == 1 and self.pred.count(true) == 1 and self.pred.count(false) == 1 and true.successors()[0] is false.successors()[0]:
                 logger.debug('if true else false')
-                return self.build_decision, (block, true, false, true.succ[0].tail)
+                return self.build_decision, (block, true, false, true.successors()[0])
 
-            if not true.succ and not false.succ and len(self.pred[true]) == 1 and len(self.pred[false]) == 1:
+            if not true.successors() and not false.successors() and self.pred.count(true) == 1 and self.pred.count(false) == 1:
                 logger.debug('if true else false')
                 return self.build_decision, (block, true, false, None)
 
-            if not true.succ:
-                if len(self.pred[true]) == 1:
+            if not true.successors():
+                if self.pred.count(true) == 1:
                     logger.debug('if true')
                     return self.build_decision, (block, true, None, false)
                 if len(true.statements) == 1 and isinstance(true.statements[0], Return):
                     logger.debug('if true')
                     r: Return = true.statements[-1]
-                    return self.build_decision, (block, Block([Return(r.returns)]), None, false)
+                    return self.build_decision, (block, self.new_block([Return(r.returns)]), None, false)
 
-            if not false.succ:
-                if len(self.pred[false]) == 1:
+            if not false.successors():
+                if self.pred.count(false) == 1:
                     logger.debug('if false')
                     return self.build_decision, (block, false, None, true, True)
                 if len(false.statements) == 1 and isinstance(false.statements[0], Return):
                     logger.debug('if false')
                     r: Return = false.statements[-1]
-                    return self.build_decision, (block, Block([Return(r.returns)]), None, true, True)
+                    return self.build_decision, (block, self.new_block([Return(r.returns)]), None, true, True)
 
     def create_dot(self, name=None):
         """For debug, use
@@ -217,61 +575,67 @@ class Graph(object):
 
     def build_loop(self, loop_type, loop: Block, entry: Block, body: Block, out: Block):
         logger.debug('build_loop {} is {} loop in graph {}'.format(loop, loop_type, self.root))
+        loops = self.closing_loops(loop_type, loop, entry, body) if loop_type != 'for_return' else []
+        self.touch(loop, entry)
         if loop_type in {'for', 'repeat'}:
-            loop.succ = []
+            self.set_succ(loop, [])
         if loop_type == 'for_return':
             for_init: ForInit = entry.statements[-1]
             entry.statements[-1] = For(for_init, StatementList(body.statements))
             body_blocks = [body]
         else:
-            body_blocks = self.get_loop_body(entry, body, out)
+            body_blocks = self.get_loop_body(entry, body, out, loops)
         if loop_type == 'for':
             for_init: ForInit = entry.statements[-1]
             for_loop = loop.statements[-1]
             loop.statements[-1] = Nop()
             assert isinstance(for_loop, ForLoop)
             assert for_loop.start.slot == for_init.start.slot
-            entry.statements[-1] = For(for_init, StatementList(Graph(body).root.statements))
+            entry.statements[-1] = For(for_init, StatementList(Graph(body, self.table).root.statements))
         elif loop_type == 'iter':
             iter_loop = entry.statements.pop()
             iter_call: IterCall = entry.statements[-1]
             assert isinstance(iter_loop, IterLoop)
             assert iter_loop.index.slot == iter_call.generator.slot + 3
-            entry.statements[-1] = ForIn(iter_call, StatementList(Graph(body).root.statements))
+            entry.statements[-1] = ForIn(iter_call, StatementList(Graph(body, self.table).root.statements))
         elif loop_type == 'while':
             body.statements[0] = Nop()
             decision: Decision = entry.statements[-1]
             decision.reverse()
-            entry.statements = [While(StatementList(entry.statements), StatementList(Graph(body).root.statements))]
+            entry.statements = [While(StatementList(entry.statements), StatementList(Graph(body, self.table).root.statements))]
         elif loop_type == 'while_true':
             entry.statements[0] = Nop()
-            entry.statements = [While(StatementList([Condition(UnExp('', Primitive(True)))]), StatementList(Graph(body).root.statements))]
+            entry.statements = [While(StatementList([Condition(UnExp('', Primitive(True)))]), StatementList(Graph(body, self.table).root.statements))]
         else:
             body.statements[0] = Nop()
             decision: Decision = loop.statements[-1]
             decision.reverse()
             loop.statements[-1] = Nop()
-            entry.statements = [Repeat(decision, StatementList(Graph(body).root.statements))]
+            entry.statements = [Repeat(decision, StatementList(Graph(body, self.table).root.statements))]
 
-        entry.succ = [Edge(out)] if out else []
-        for b in body_blocks:
-            del b
+        self.set_succ(entry, [Edge(out)] if out else [])
+        self.detach(b for b in body_blocks if b is not entry)
 
-    def get_loop_body(self, entry: Block, body: Block, out: Block) -> List[Block]:
-        visited = {entry, out}
-        stack = [body]
+    def get_loop_body(self, entry: Block, body: Block, out: Block, loops: List[Loop]) -> List[Block]:
+        """
+        The blocks of loops, see closing_loops(), and the blocks which leave them other than through out, such as returns.
+        Edges back to entry and edges to out are rewritten on the way
+        """
+        members = list({b: None for loop in loops for b in loop.blocks if b is not entry and b is not out and b in self.linked})
+        visited = {entry, out, body}
+        visited.update(members)
+        stack = [body] + members
         body_blocks = []
-        exit_block = Block([Nop()])
+        exit_block = self.new_block([Nop()])
         while stack:
-            block = stack.pop(0)
-            visited.add(block)
+            block = stack.pop()
             body_blocks.append(block)
-            for edge in block.succ:
-                if edge.tail is entry:
-                    edge.tail = exit_block
-            if any([e.tail == out for e in block.succ]):
+            for k, tail in enumerate(block.successors()):
+                if tail is entry:
+                    self.redirect(block, k, exit_block)
+            if out in block.successors():
                 if isinstance(block.statements[-1], Decision):
-                    break_block = Block([Break()])
+                    break_block = self.new_block([Break()])
                     if block.find_succ(False) == out:
                         # reverse the condition so true edge is break
                         decision: Decision = block.statements[-1]
@@ -279,72 +643,80 @@ class Graph(object):
                         target = block.find_succ(True)
                     else:
                         target = block.find_succ(False)
-                    block.succ = [Edge(break_block, True), Edge(target, False)]
+                    self.set_succ(block, [Edge(break_block, True), Edge(target, False)])
                 else:
                     assert len(block.succ) == 1 and block.succ[0].condition is None
                     block.statements.append(Break())
-                    block.succ = []
-            stack = [e.tail for e in block.succ if e.tail not in visited] + stack
+                    self.set_succ(block, [])
+                self.touch(block)
+            # blocks outside the loop which are only left through returns or out
+            for tail in block.successors():
+                if tail not in visited:
+                    visited.add(tail)
+                    stack.append(tail)
 
         logger.debug('head is {}, out is {}, body is {}'.format(entry, out, body_blocks))
         return body_blocks
 
     def merge_decision(self, block: Block, merged: Block, op, new_edges, reverse_left=False):
         logger.debug('merge_decision block:{} merged:{} new_edges:{}'.format(block, merged, new_edges))
-        merged.succ = []
+        self.set_succ(merged, [])
         left: Decision = block.statements[-1]
         if reverse_left:
             left.reverse()
-        block.statements[-1] = BinCondition(op, left, StatementList(Graph(merged).root.statements))
-        block.succ = new_edges
-        del merged
+        block.statements[-1] = BinCondition(op, left, StatementList(Graph(merged, self.table).root.statements))
+        self.set_succ(block, new_edges)
+        self.touch(block)
 
     def build_decision(self, block: Block, then, other, out, reverse_condition=False):
         logger.debug('build_decision block:{} then:{} other:{} out:{} reverse_condition:{}'.format(block, then, other, out, reverse_condition))
-        deleted = []
         condition: Decision = block.statements[-1]
         if then:
-            deleted.append(then)
-            then.succ = []
+            self.set_succ(then, [])
             then = StatementList(then.statements)
         if other:
-            deleted.append(other)
-            other.succ = []
+            self.set_succ(other, [])
             other = StatementList(other.statements)
         if reverse_condition:
             condition.reverse()
         block.statements[-1] = If(condition, then, other)
-        block.succ = [Edge(out)] if out else []
-        for b in deleted:
-            del b
+        self.set_succ(block, [Edge(out)] if out else [])
+        self.touch(block)
 
-    def simplify(self):
-        """ Remove empty blocks and edges"""
+    def simplify(self, region: List[Block]):
+        """
+        Remove empty blocks and edges around the given blocks.
+        The rest of the graph is simplified already, region is every block for a new graph
+        """
         # remove blocks with no statement
-        for block in self.blocks():
-            for edge in block.succ:
-                while (not edge.tail.statements or all(isinstance(s, Nop) for s in edge.tail.statements)) and len(edge.tail.succ) == 1:
-                    logger.trace('remove block {}'.format(edge.tail))
-                    empty = edge.tail
-                    edge.tail = edge.tail.succ[0].tail
-                    del empty
+        for block in self.with_preds(region + list(self.unsimplified)):
+            for k, tail in enumerate(block.successors()):
+                while (not tail.statements or all(isinstance(s, Nop) for s in tail.statements)) and len(tail.successors()) == 1:
+                    logger.trace('remove block {}'.format(tail))
+                    tail = tail.successors()[0]
+                    self.redirect(block, k, tail)
+        self.unsimplified.clear()
+        self.commit()
 
-        self.update_pred()
         # remove single in single out edge
-        for block in self.blocks():
-            while len(block.succ) == 1 and block.succ[0].tail != self.root and len(self.pred[block.succ[0].tail]) == 1:
-                merged = block.succ[0].tail
+        for block in self.with_preds(list(self.changed)):
+            while block in self.linked and len(block.successors()) == 1:
+                merged = block.successors()[0]
+                if merged is self.root or self.pred.count(merged) != 1:
+                    break
                 logger.debug('merge edge {} {}'.format(block, block.succ[0]))
-                block.statements += merged.statements
-                block.succ = merged.succ
-                del merged
-        self.update_pred()
-
-    def update_pred(self):
-        """
-        Update predecessors table
-        """
-        self.pred.clear()
-        for block in self.blocks():
-            for edge in block.succ:
-                self.pred[edge.tail].append(Edge(block, edge.condition))
+                self.merge_blocks(block, merged)
+                self.touch(block)
+                # edges to a block which became empty are removed by the next simplify
+                self.unsimplified[block] = None
+        self.commit()
+
+    def with_preds(self, blocks: List[Block]) -> List[Block]:
+        """The live blocks among blocks and their predecessors"""
+        result = {}
+        for block in blocks:
+            if block in self.linked:
+                result[block] = None
+                for pred in self.pred.of(block):
+                    result[pred] = None
+        return list(result)
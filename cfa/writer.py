@@ -4,7 +4,7 @@ from typing import TextIO
 
 from cfa.ast import Slot, FuncCall, \
     Assign, StatementList, BinCondition, If, For, ForIn, While, Repeat, ExpList, Constant, Literal, TableElement, Nop, Condition, BinExp, UnExp, Return, Primitive, FuncDef, OP_PRECEDENCE, Decision, \
-    TableConstructor, Vararg, Upvalue
+    TableConstructor, Vararg, Upvalue, Disassembly
 from cfa.visitor import Visitor
 
 
@@ -221,6 +221,18 @@ class LuaWriter(Visitor):
         self.file.write('until ')
         self.visit(s.condition)
 
+    def visit_disassembly(self, s: Disassembly):
+        # a long comment whose brackets do not occur in the listing
+        level = 0
+        while ']{}]'.format('=' * level) in s.listing:
+            level += 1
+        self.file.write('--[{}[ ljtool: {}'.format('=' * level, s.reason))
+        for line in s.listing.rstrip('\n').split('\n'):
+            self.new_line()
+            self.file.write(line)
+        self.new_line()
+        self.file.write(']{}]'.format('=' * level))
+
     def visit_block(self, node):
         self.scopes.insert(0, set())
         self.visit(node)
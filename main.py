@@ -1,7 +1,9 @@
 import os
 from io import StringIO
 
+from bc.disassembler import Disassembler
 from bc.formatter import Formatter
+from bc.minifier import Minifier
 from bc.reader import Reader
 from bc.writer import DumpWriter
 from cfa.builder import Builder
@@ -14,10 +16,14 @@ def get_dump(filename):
     return reader.dump
 
 
+def probe(src, count_prototypes=False):
+    return Reader(src, 'utf-8').probe(count_prototypes)
+
+
 def write_python(dump, target):
     formatter = Formatter(dump, 'utf-8')
     with open(target, 'w') as f:
-        f.write(formatter.format())
+        formatter.write(f)
 
 
 def write_dump(dump, target):
@@ -25,8 +31,30 @@ def write_dump(dump, target):
     writer.write()
 
 
+def minify_dump(src, target):
+    """Write a stripped and minified copy of src, returns the bytes saved per prototype number"""
+    dump = get_dump(src)
+    minifier = Minifier(dump, 'utf-8')
+    savings = minifier.minify()
+    data = DumpWriter(dump, None, 'utf-8').write_to_bytes()
+    minifier.verify(data)
+    with open(target, 'wb') as f:
+        f.write(data)
+    return savings
+
+
+def disassemble(src, target):
+    """Write a listing of src in a single pass, each prototype is written as soon as it is read"""
+    reader = Reader(src, 'utf-8', compact=True)
+    with open(target, 'w') as f:
+        disassembler = Disassembler(f)
+        for prototype in reader.iter_prototypes(link_children=False):
+            disassembler.name = reader.dump.name
+            disassembler.write_prototype(prototype)
+
+
 def build_ast(dump):
-    return Builder(dump.prototypes[0]).build(True)
+    return Builder(dump.prototypes[0], dump.name).build(True)
 
 
 def write_lua(dump, target):
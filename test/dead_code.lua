@@ -0,0 +1,6 @@
+local function dead(a)
+  do return a end
+  print("never")
+  return a + 1
+end
+return dead
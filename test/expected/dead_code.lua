@@ -0,0 +1,3 @@
+return function (slot0)
+	return slot0
+end
\ No newline at end of file
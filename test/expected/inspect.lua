@@ -0,0 +1,405 @@
+local slot0 = {["_VERSION"]="inspect.lua 3.1.0", ["_DESCRIPTION"]="human-readable representations of tables", ["_URL"]="http://github.com/kikito/inspect.lua", ["_LICENSE"]="    MIT LICENSE
+
+    Copyright (c) 2013 Enrique García Cota
+
+    Permission is hereby granted, free of charge, to any person obtaining a
+    copy of this software and associated documentation files (the
+    "Software"), to deal in the Software without restriction, including
+    without limitation the rights to use, copy, modify, merge, publish,
+    distribute, sublicense, and/or sell copies of the Software, and to
+    permit persons to whom the Software is furnished to do so, subject to
+    the following conditions:
+
+    The above copyright notice and this permission notice shall be included
+    in all copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+    OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+    MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+    IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+    CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+    TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+    SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+  "}
+local slot1 = tostring
+local slot4 = {["__tostring"]=None}
+slot4.__tostring = function ()
+	return "inspect.KEY"
+end
+slot0.KEY = setmetatable({}, slot4)
+slot4 = {["__tostring"]=None}
+slot4.__tostring = function ()
+	return "inspect.METATABLE"
+end
+slot0.METATABLE = setmetatable({}, slot4)
+local slot2 = function (slot0)
+	return next, slot0, nil, slot4, ljtool.mutli_res
+end
+local slot3 = function (slot0)
+	slot1 = slot0.match(slot0, """)
+	if slot1 and not slot0.match(slot0, "'") then
+		return "'" .. slot0 .. "'"
+	end
+	return """ .. slot0.gsub(slot0, """, "\"") .. """
+end
+slot4 = {[""]="\f", [""]="\b", [""]="\a", [""]="\v", ["
+"]="\n", [""]="\r", ["	"]="\t"}
+local slot5 = {}
+for slot9 = 0, 31, 1 do
+	local slot10 = string.char(slot9)
+	if not slot4[slot10] then
+		slot4[slot10] = "\" .. slot9
+		slot5[slot10] = string.format("\%03d", slot9)
+	end
+end
+local slot6 = function (slot0)
+	slot1 = slot0.gsub(slot0, "\", "\\")
+	slot2 = slot1
+	slot1 = slot1.gsub
+	slot1 = slot1(slot2, "(%c)%f[0-9]", slot0)
+	slot2 = slot1
+	slot1 = slot1.gsub
+	return slot1(slot2, "%c", slot1)
+end
+local slot7 = function (slot0)
+	slot1 = type(slot0)
+	if slot1 == "string" then
+		slot1 = slot0.match(slot0, "^[_%a][_%a%d]*$")
+	else
+		slot1 = false
+	end
+	return slot1
+end
+local slot8 = function (slot0, slot1)
+	slot2 = type(slot0)
+	if slot2 ~= "number" or 1 > slot0 or slot0 > slot1 or math.floor(slot0) ~= slot0 then
+		slot2 = false
+	else
+		slot2 = true
+	end
+	return slot2
+end
+local slot9 = {["table"]=4, ["boolean"]=2, ["function"]=5, ["userdata"]=6, ["string"]=3, ["thread"]=7, ["number"]=1}
+local slot10 = function (slot0, slot1)
+	slot2 = type(slot0)
+	slot3 = type(slot1)
+	if slot2 ~= slot3 or slot2 ~= "string" and slot2 ~= "number" then
+		slot4 = uv0[slot2]
+		slot5 = uv0[slot3]
+		if not slot4 or not slot5 then
+			if slot4 then
+				return true
+			end
+			if slot5 then
+				return false
+			end
+			if slot2 >= slot3 then
+				slot6 = false
+			else
+				slot6 = true
+			end
+			return slot6
+		end
+		if uv0[slot2] >= uv0[slot3] then
+			slot6 = false
+		else
+			slot6 = true
+		end
+		return slot6
+	end
+	if slot0 >= slot1 then
+		slot4 = false
+	else
+		slot4 = true
+	end
+	return slot4
+end
+local slot11 = function (slot0)
+	slot1 = 1
+	slot2 = rawget(slot0, slot1)
+	while slot2 ~= nil do
+		slot1 = slot1 + 1
+		slot2 = rawget(slot0, slot1)
+	end
+	return slot1 - (1)
+end
+local slot12 = function (slot0)
+	slot1 = {}
+	slot2 = 0
+	slot3 = slot0(slot0)
+	for slot7, slot8 in slot1(slot0) do
+		slot9 = slot2(slot7, slot3)
+		if not slot9 then
+			slot2 = slot2 + 1
+			slot1[slot2] = slot7
+		end
+	end
+	table.sort(slot1, slot3)
+	return slot1, slot2, slot3, slot7, ljtool.mutli_res
+end
+local slot13 = function (slot0, slot1)
+	if not slot1 then
+		slot1 = {}
+	end
+	slot2 = type(slot0)
+	if slot2 ~= "table" then
+		return slot1
+	end
+	if not slot1[slot0] then
+		slot1[slot0] = 1
+		for slot5, slot6 in slot0(slot0) do
+			slot1(slot5, slot1)
+			slot1(slot6, slot1)
+		end
+		slot1(getmetatable(slot0), slot1)
+	else
+		slot1[slot0] = slot1[slot0] + 1
+	end
+	return slot1
+end
+local slot14 = function (slot0)
+	slot1 = {}
+	slot2 = #slot0
+	slot5 = 1
+	for slot6 = 1, slot2, slot5 do
+		slot1[slot6] = slot0[slot6]
+	end
+	return slot1, slot2, slot5, ljtool.mutli_res
+end
+local slot15 = function (...)
+	slot1 = {}
+	ljtool.table_set_multi(slot1, ...)
+	slot2, slot3 = slot0(slot0)
+	for slot7 = 1, #slot1, 1 do
+		slot2[slot3 + slot7] = slot1[slot7]
+	end
+	return slot2
+end
+local slot16 = function (slot0, slot1, slot2, slot3)
+	if slot1 == nil then
+		return nil
+	end
+	if slot3[slot1] then
+		return slot3[slot1]
+	end
+	slot4 = slot0(slot1, slot2)
+	slot5 = type(slot4)
+	if slot5 ~= "table" then
+		return slot5
+	end
+	slot5 = {}
+	slot3[slot1] = slot5
+	slot6 = nil
+	for slot10, slot11 in slot0(slot4) do
+		slot6 = slot1(slot0, slot10, slot2(slot2, slot10, uv3.KEY), slot3)
+		if slot6 ~= nil then
+			slot5[slot6] = slot1(slot0, slot11, slot2(slot2, slot6), slot3)
+		end
+	end
+	slot7 = slot1(slot0, getmetatable(slot4), slot2(slot2, uv3.METATABLE), slot3)
+	slot8 = type(slot7)
+	if slot8 ~= "table" then
+		slot7 = nil
+	end
+	setmetatable(slot5, slot7)
+	return slot5
+end
+local slot17 = {}
+local slot18 = {["__index"]=None}
+slot18.__index = slot17
+slot17.puts = function (...)
+	slot1 = {}
+	ljtool.table_set_multi(slot1, ...)
+	slot2 = slot0.buffer
+	slot3 = #slot2
+	for slot7 = 1, #slot1, 1 do
+		slot3 = slot3 + 1
+		slot2[slot3] = slot1[slot7]
+	end
+	return 
+end
+slot17.down = function (slot0, slot1)
+	slot0.level = slot0.level + 1
+	slot1()
+	slot0.level = slot0.level - (1)
+	return 
+end
+slot17.tabify = function (slot0)
+	slot0.puts(slot0, slot0.newline, string.rep(slot0.indent, slot0.level))
+	return 
+end
+slot17.alreadyVisited = function (slot0, slot1)
+	if slot0.ids[slot1] == nil then
+		slot2 = false
+	else
+		slot2 = true
+	end
+	return slot2
+end
+slot17.getId = function (slot0, slot1)
+	slot2 = slot0.ids[slot1]
+	if not slot2 then
+		slot3 = type(slot1)
+		slot4 = slot0.maxIds[slot3]
+		if not slot4 then
+			slot4 = 0
+		end
+		slot2 = slot4 + 1
+		slot0.maxIds[slot3] = slot2
+		slot0.ids[slot1] = slot2
+	end
+	return slot0(slot2)
+end
+slot17.putKey = function (slot0, slot1)
+	slot2 = slot0(slot1)
+	if slot2 then
+		return slot0.puts(slot0, slot1)
+	end
+	slot0.puts(slot0, "[")
+	slot0.putValue(slot0, slot1)
+	slot0.puts(slot0, "]")
+	return 
+end
+slot17.putTable = function (slot0, slot1)
+	if slot1 == uv0.KEY or slot1 == uv0.METATABLE then
+		slot0.puts(slot0, slot1(slot1))
+	else
+		slot2 = slot0.alreadyVisited(slot0, slot1)
+		if slot2 then
+			slot0.puts(slot0, "<table ", slot0.getId(slot0, slot1), ">")
+		else
+			if 1 < slot0.tableAppearances[slot1] then
+				slot0.puts(slot0, "<", slot0.getId(slot0, slot1), ">")
+			end
+			slot2, slot3, slot4 = slot2(slot1)
+			slot5 = getmetatable(slot1)
+			slot0.puts(slot0, "{")
+			slot0.down(slot0, function ()
+				slot0 = 0
+				for slot4 = 1, slot0, 1 do
+					if 0 < slot0 then
+						slot5 = slot1
+						slot6 = slot5
+						slot5 = slot5.puts
+						slot5(slot6, ",")
+					end
+					slot5 = slot1
+					slot6 = slot5
+					slot5 = slot5.puts
+					slot5(slot6, " ")
+					slot5 = slot1
+					slot6 = slot5
+					slot5 = slot5.putValue
+					slot5(slot6, uv2[slot4])
+					slot0 = slot0 + 1
+				end
+				for slot4 = 1, slot3, 1 do
+					slot5 = uv4[slot4]
+					if 0 < slot0 then
+						slot6 = slot1
+						slot7 = slot6
+						slot6 = slot6.puts
+						slot6(slot7, ",")
+					end
+					slot6 = slot1
+					slot7 = slot6
+					slot6 = slot6.tabify
+					slot6(slot7)
+					slot6 = slot1
+					slot7 = slot6
+					slot6 = slot6.putKey
+					slot6(slot7, slot5)
+					slot6 = slot1
+					slot7 = slot6
+					slot6 = slot6.puts
+					slot6(slot7, " = ")
+					slot6 = slot1
+					slot7 = slot6
+					slot6 = slot6.putValue
+					slot6(slot7, uv2[slot5])
+					slot0 = slot0 + 1
+				end
+				slot1 = type(slot5)
+				if slot1 ~= "table" then
+					return 
+				end
+				if 0 < slot0 then
+					slot1 = slot1
+					slot2 = slot1
+					slot1 = slot1.puts
+					slot1(slot2, ",")
+				end
+				slot1 = slot1
+				slot2 = slot1
+				slot1 = slot1.tabify
+				slot1(slot2)
+				slot1 = slot1
+				slot2 = slot1
+				slot1 = slot1.puts
+				slot1(slot2, "<metatable> = ")
+				slot1 = slot1
+				slot2 = slot1
+				slot1 = slot1.putValue
+				slot1(slot2, slot5)
+				return 
+			end)
+			if 0 < slot3 or type(slot5) == "table" then
+				slot0.tabify(slot0)
+			else
+				if 0 < slot4 then
+					slot0.puts(slot0, " ")
+				end
+			end
+			slot0.puts(slot0, "}")
+		end
+	end
+	return 
+end
+slot17.putValue = function (slot0, slot1)
+	slot2 = type(slot1)
+	if slot2 == "string" then
+		slot0.puts(slot0, slot0(slot1(slot1)))
+	else
+		slot0.puts(slot0, "<", slot2, " ", slot0.getId(slot0, slot1), ">")
+	end
+	return 
+end
+slot0.inspect = function (slot0, slot1)
+	if not slot1 then
+		slot1 = {}
+	end
+	slot2 = slot1.depth
+	if not slot2 then
+		slot2 = math.huge
+	end
+	slot3 = slot1.newline
+	if not slot3 then
+		slot3 = "
+"
+	end
+	slot4 = slot1.indent
+	if not slot4 then
+		slot4 = "  "
+	end
+	slot5 = slot1.process
+	if slot5 then
+		slot0 = slot0(slot5, slot0, {}, {})
+	end
+	slot7 = {["indent"]=None, ["depth"]=None, ["maxIds"]=None, ["buffer"]=None, ["ids"]=None, ["tableAppearances"]=None, ["newline"]=None, ["level"]=0}
+	slot7.depth = slot2
+	slot7.buffer = {}
+	slot7.ids = {}
+	slot7.maxIds = {}
+	slot7.newline = slot3
+	slot7.indent = slot4
+	slot7.tableAppearances = slot1(slot0)
+	slot6 = setmetatable(slot7, slot2)
+	slot6.putValue(slot6, slot0)
+	return table.concat(slot6.buffer)
+end
+local slot21 = {["__call"]=None}
+slot21.__call = function (...)
+	return uv0.inspect(...)
+end
+setmetatable(slot0, slot21)
+return slot0
\ No newline at end of file
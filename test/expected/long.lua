@@ -0,0 +1,81 @@
+return function (slot0, slot1, slot2)
+	local slot3 = 0
+	for slot7 = 1, 10, 1 do
+		if slot0 < slot7 then
+			slot3 = slot3 + slot7 * 2
+		else
+			slot3 = slot3 .. "x"
+		end
+		local slot8 = {None, None, "k", None, 1.5}
+		slot8[1] = slot7
+		slot8[3] = -slot7
+		slot2[slot7] = slot8
+		slot2.name = "value" .. slot7
+		if slot2[slot7][2] == "k" and slot3 ~= -100 then
+			slot3 = slot3 + slot2[slot7][1]
+		end
+	end
+	while 1000 < slot3 do
+		slot3 = slot3 / (2) - (7)
+		if slot3 == 12 then
+			break
+		end
+	end
+	repeat
+		local slot0 = slot0 + 1
+		if slot0 % (3) == 0 then
+			local slot5 = "fizz"
+		else
+			local slot5 = slot0
+		end
+		slot2["a" .. slot0] = slot5
+		if slot1 <= slot0 then
+			break
+		end
+	until 200 < slot0
+	local slot4 = {["z"]=-32768, ["x"]=1, ["y"]=2}
+	for slot8, slot9 in pairs(slot4) do
+		slot2[slot8] = slot9 * slot3 - (0.25)
+		if slot9 < -1000 then
+			slot2[slot8] = nil
+		end
+	end
+	if slot0 ~= nil then
+		local slot5 = 1
+	else
+		local slot5 = 0
+	end
+	local slot5 = slot3 + slot5
+	slot5 = slot5 - (#slot2)
+	local slot6 = slot1
+	if not slot1 then
+		slot6 = 4
+	end
+	slot6 = slot6 * -2
+	slot3 = slot5 + slot6
+	if 10 < slot3 then
+		slot2.big = slot3
+	else
+		slot2.zero = 0
+	end
+	while slot2.zero and slot3 < 50 do
+		slot3 = slot3 + 3
+		if 40 >= slot3 then
+			
+		end
+		slot2.zero = slot3
+	end
+	for slot8 = 10, 1, -2 do
+		local slot9 = slot2[slot8]
+		if not slot9 then
+			slot9 = 0
+		end
+		slot9 = slot9 + slot8
+		slot2[slot8] = slot9
+	end
+	local slot7 = slot0
+	print(slot3, slot7, slot1, slot4.x, slot4.y, slot4.z, slot2.name, "done", 3.25, -1.5, true, false, nil)
+	return slot3, function ()
+		return slot0 + slot1 + slot2
+	end, slot7, ljtool.mutli_res
+end
\ No newline at end of file
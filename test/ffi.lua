@@ -0,0 +1,4 @@
+local big = 0x7fffffffffffffffLL
+local unsigned = 1ULL
+local z = 2i
+print(big, unsigned, z)
@@ -0,0 +1,16 @@
+local function irreducible(a, b)
+  local x = 0
+  if a then goto inside end
+  ::top::
+  x = x + 1
+  ::inside::
+  x = x * 2
+  if x < b then goto top end
+  return x
+end
+local function fine(n)
+  local s = 0
+  for i = 1, n do s = s + i end
+  return s
+end
+return irreducible, fine
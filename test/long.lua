@@ -0,0 +1,29 @@
+local function long(a, b, t)
+  local s = 0
+  for i = 1, 10 do
+    if a < i then s = s + i * 2 elseif b > -3 then s = s - 5 else s = s .. "x" end
+    t[i] = {i, "k", -i, 1.5}
+    t.name = "value" .. i
+    if t[i][2] == "k" and s ~= -100 then s = s + t[i][1] end
+  end
+  while s > 1000 do
+    s = s / 2 - 7
+    if s == 12 then break end
+  end
+  repeat
+    a = a + 1
+    t["a" .. a] = a % 3 == 0 and "fizz" or a
+  until a >= b or a > 200
+  local u = {x = 1, y = 2, z = -32768}
+  for k, v in pairs(u) do
+    t[k] = v * s - 0.25
+    if v < -1000 then t[k] = nil end
+  end
+  s = s + (a ~= nil and 1 or 0) - #t + (b or 4) * -2
+  if s > 10 then t.big = s elseif s < -10 then t.small = s else t.zero = 0 end
+  while t.zero and s < 50 do s = s + 3; t.zero = s > 40 and nil or s end
+  for j = 10, 1, -2 do t[j] = (t[j] or 0) + j end
+  print(s, a, b, u.x, u.y, u.z, t.name, "done", 3.25, -1.5, true, false, nil)
+  return s, function() return a + b + s end
+end
+return long
@@ -0,0 +1,152 @@
+import os
+from io import StringIO
+
+import pytest
+
+from bc.reader import Reader
+from cfa.ast import Disassembly
+from cfa.builder import Builder
+from cfa.dominator import DominatorTree, LoopForest
+from cfa.graph import BlockTable, Edge, Graph
+from cfa.writer import LuaWriter
+
+TEST_DIR = os.path.dirname(__file__)
+
+
+def read(name):
+    reader = Reader(os.path.join(TEST_DIR, name), 'utf-8')
+    reader.read()
+    return reader.dump
+
+
+def functions(name):
+    return read(name).prototypes[0].child_prototypes()
+
+
+def test_irreducible_falls_back_to_listing():
+    fine, irreducible = functions('irreducible.luajit')
+
+    statements = Builder(irreducible).build().statements.content
+    assert len(statements) == 1 and isinstance(statements[0], Disassembly)
+    assert 'not reducible' in statements[0].reason
+    assert statements[0].listing.count('\n') >= len(irreducible.instructions)
+
+    statements = Builder(fine).build().statements.content
+    assert not any(isinstance(s, Disassembly) for s in statements)
+
+
+def test_unreduced_falls_back_to_listing():
+    fine, unreduced = functions('unreduced.luajit')
+
+    statements = Builder(unreduced).build().statements.content
+    assert len(statements) == 1 and isinstance(statements[0], Disassembly)
+    assert 'cannot be simplified' in statements[0].reason
+
+    # the rest of the file is still decompiled
+    dump = read('unreduced.luajit')
+    out = StringIO()
+    LuaWriter(Builder(dump.prototypes[0], dump.name).build(True), out).write()
+    assert out.getvalue().count('-- BYTECODE --') == 1 and 'for slot' in out.getvalue()
+
+
+@pytest.mark.parametrize('name', ['inspect', 'long', 'dead_code'])
+def test_decompiled_output(name):
+    dump = read(name + '.luajit')
+    out = StringIO()
+    LuaWriter(Builder(dump.prototypes[0], dump.name).build(True), out).write()
+    with open(os.path.join(TEST_DIR, 'expected', name + '.lua'), newline='') as fd:
+        assert out.getvalue() == fd.read()
+
+
+def test_unreachable_blocks_are_pruned():
+    dead, = functions('dead_code.luajit')
+
+    builder = Builder(dead)
+    statements = builder.build().statements.content
+    assert builder.pruned_instructions > 0
+    assert not any(isinstance(s, Disassembly) for s in statements)
+    assert 'never' not in repr(statements)
+
+
+def test_fallback_listing_names_the_chunk():
+    dump = read('irreducible.luajit')
+
+    out = StringIO()
+    LuaWriter(Builder(dump.prototypes[0], dump.name).build(True), out).write()
+    assert '-- BYTECODE -- {}:'.format(dump.name) in out.getvalue()
+
+
+def graph(*succ):
+    table = BlockTable()
+    blocks = [table.new_block([]) for _ in succ]
+    for block, edges in zip(blocks, succ):
+        table.set_succ(block, [Edge(blocks[tail], condition) for tail, condition in edges])
+    return blocks
+
+
+def test_loop_forest():
+    # 0 -> 1, while 1: (2 -> 3, while 3: 2) -> 4 -> 1, 1 -> 5
+    blocks = graph([(1, None)], [(2, False), (5, True)], [(3, None)], [(2, False), (4, True)], [(1, None)], [])
+
+    forest = LoopForest(DominatorTree(blocks[0]))
+    (outer,), (inner,) = forest.loops[blocks[1]], forest.loops[blocks[2]]
+    assert set(forest.loops) == {blocks[1], blocks[2]}
+    assert outer.blocks == set(blocks[1:5]) and inner.blocks == set(blocks[2:4])
+    assert (outer.latch, inner.latch) == (blocks[4], blocks[3])
+    assert inner.parent is outer and outer.parent is None
+    assert forest.innermost[blocks[3]] is inner and forest.innermost[blocks[4]] is outer
+    assert forest.is_back_edge(blocks[3], blocks[2]) and forest.is_back_edge(blocks[4], blocks[1])
+    assert not forest.is_back_edge(blocks[1], blocks[2])
+    assert forest.loops_through(blocks[1], blocks[2]) == [outer] and forest.loops_through(blocks[1], blocks[5]) == []
+
+
+def test_loops_sharing_a_header():
+    # a loop whose body starts with a repeat loop: 0 -> 1, 1 -> 1 until true, 1 -> 2 -> 1 or 3
+    blocks = graph([(1, None)], [(1, True), (2, False)], [(1, True), (3, False)], [])
+
+    forest = LoopForest(DominatorTree(blocks[0]))
+    inner, outer = forest.loops[blocks[1]]
+    assert inner.blocks == {blocks[1]} and outer.blocks == set(blocks[1:3])
+    assert inner.parent is outer
+
+
+def test_block_table():
+    blocks = graph([(1, True), (2, False)], [(2, None)], [])
+    table = blocks[0].table
+
+    assert blocks[0].successors() == blocks[1:] and blocks[2].successors() == []
+    assert blocks[0].find_succ(False) is blocks[2] and blocks[1].find_succ(True) is None
+    assert [(e.tail, e.condition) for e in blocks[0].succ] == [(blocks[1], True), (blocks[2], False)]
+
+    assert table.set_tail(blocks[0], 1, blocks[0]) is blocks[2]
+    assert blocks[0].find_succ(False) is blocks[0]
+    assert table.new_block([]).index == 3
+
+
+def fresh_loops(method, compare):
+    """method of Graph, checked against the same call on a loop forest built from scratch"""
+    def check(self, *args):
+        result = method(self, *args)
+        kept = self.loops
+        self.loops = None
+        fresh = method(self, *args)
+        self.loops = kept
+        assert compare(self, result) == compare(self, fresh)
+        check.calls += 1
+        return result
+
+    check.calls = 0
+    return check
+
+
+@pytest.mark.parametrize('name', ['loop', 'long', 'inspect'])
+def test_kept_loop_forest_matches_a_fresh_one(monkeypatch, name):
+    # the forest is kept across build_loop and merge_blocks, see Graph.reset_loops()
+    construct_loop = fresh_loops(Graph.construct_loop, lambda graph, op: op)
+    closing_loops = fresh_loops(Graph.closing_loops, lambda graph, loops: {b for loop in loops for b in loop.blocks if b in graph.linked})
+    monkeypatch.setattr(Graph, 'construct_loop', construct_loop)
+    monkeypatch.setattr(Graph, 'closing_loops', closing_loops)
+
+    dump = read(name + '.luajit')
+    Builder(dump.prototypes[0], dump.name).build(True)
+    assert construct_loop.calls and closing_loops.calls
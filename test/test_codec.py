@@ -0,0 +1,51 @@
+import os
+
+import pytest
+
+from bc import codec, writer
+from bc.reader import Reader
+from bc.writer import DumpWriter
+
+LONG = os.path.join(os.path.dirname(__file__), 'long.luajit')
+
+
+def long_prototype():
+    reader = Reader(LONG, 'utf-8')
+    reader.read()
+    prototype = max(reader.dump.sorted_prototypes(), key=lambda pt: len(pt.instructions))
+    assert len(prototype.instructions) >= codec.NUMPY_MIN_INSTRUCTIONS
+    return reader.dump, prototype
+
+
+def operands(prototype):
+    instructions = prototype.instructions
+    return ([ins.OPCODE for ins in instructions], [getattr(ins, 'a', 0) for ins in instructions],
+            [getattr(ins, 'b', 0) for ins in instructions], [getattr(ins, 'cd', 0) for ins in instructions])
+
+
+def test_numpy_matches_pure_python(monkeypatch):
+    pytest.importorskip('numpy')
+    _, prototype = long_prototype()
+    const_base = len(prototype.constants) - 1
+
+    codewords = codec.join_codewords(*operands(prototype), const_base)
+    split = codec.split_codewords(codewords, const_base)
+    monkeypatch.setattr(codec, 'numpy', None)
+    assert codec.join_codewords(*operands(prototype), const_base) == codewords
+    assert codec.split_codewords(codewords, const_base) == split
+    # B is only set for ABC instructions, the others keep the high byte of D there
+    opcodes, a, _, cd = operands(prototype)
+    assert (split[0], split[1], split[3]) == (opcodes, a, cd)
+    assert all(type(value) is int for seq in split for value in seq)
+
+
+@pytest.mark.parametrize('use_numpy', [False, True])
+def test_round_trip(monkeypatch, use_numpy):
+    if use_numpy:
+        pytest.importorskip('numpy')
+    else:
+        monkeypatch.setattr(codec, 'numpy', None)
+        monkeypatch.setattr(writer, 'numpy', None)
+    dump, _ = long_prototype()
+    with open(LONG, 'rb') as fd:
+        assert DumpWriter(dump).write_to_bytes() == fd.read()
@@ -0,0 +1,75 @@
+import os
+
+import pytest
+
+from bc.data import ConstRef, CONSTANT_OPERAND_TYPES
+from bc.reader import Reader
+
+INSPECT = os.path.join(os.path.dirname(__file__), 'inspect.luajit')
+
+
+def main_chunk(**kwargs):
+    reader = Reader(INSPECT, 'utf-8', **kwargs)
+    reader.read()
+    return reader.dump.sorted_prototypes()[-1]
+
+
+def test_constant_index_after_set_item():
+    pt = main_chunk()
+    old = pt.constants[0]
+    pt.constant_index(old)
+    new = ConstRef(old.ref)
+    pt.constants[0] = new
+    assert pt.constant_index(new) == 0
+    with pytest.raises(ValueError):
+        pt.constant_index(old)
+
+    # changes which bypass the change count are caught on lookup
+    newer = ConstRef(old.ref)
+    list.__setitem__(pt.constants, 0, newer)
+    assert pt.constant_index(newer) == 0
+
+
+def test_constant_index_after_reverse():
+    pt = main_chunk()
+    constants = list(pt.constants)
+    assert [pt.constant_index(c) for c in constants] == list(range(len(constants)))
+    pt.constants.reverse()
+    assert [pt.constant_index(c) for c in constants] == list(range(len(constants)))[::-1]
+
+
+def test_constant_references_after_operand_edit():
+    pt = main_chunk()
+    pc, ins = next((pc, ins) for pc, ins in enumerate(pt.instructions) if ins.CD_TYPE in CONSTANT_OPERAND_TYPES)
+    const = pt.constants[ins.cd]
+    other = next(c for c in pt.constants if c is not const and type(c.ref) is type(const.ref))
+    assert pc in pt.constant_references(const)
+
+    ins.cd = pt.constant_index(other)
+    assert pc not in pt.constant_references(const)
+    assert pc in pt.constant_references(other)
+
+
+def test_constant_references_compact():
+    pt = main_chunk(compact=True)
+    pc, ins = next((pc, ins) for pc, ins in enumerate(pt.instructions) if ins.CD_TYPE in CONSTANT_OPERAND_TYPES)
+    const = pt.constants[ins.cd]
+    assert pc in pt.constant_references(const)
+
+    ins.cd = pt.constant_index(next(c for c in pt.constants if c is not const and type(c.ref) is type(const.ref)))
+    pt.instructions[pc] = ins
+    assert pc not in pt.constant_references(const)
+
+
+def test_reference_map_is_kept():
+    pt = main_chunk()
+    const = pt.constants[0]
+    pt.constant_references(const)
+    references = pt.reference_map
+
+    # reading and operand edits elsewhere do not touch the map
+    other = main_chunk()
+    other.constant_references(other.constants[0])
+    other.instructions[1].a += 1
+    pt.constant_references(const)
+    assert pt.reference_map is references
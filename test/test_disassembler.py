@@ -0,0 +1,49 @@
+import io
+import os
+
+from bc.data import INSTRUCTIONS, InsType
+from bc.disassembler import Disassembler, MAX_STRING_LENGTH
+from bc.reader import Reader
+
+INSPECT = os.path.join(os.path.dirname(__file__), 'inspect.luajit')
+
+
+def disassemble(**kwargs):
+    reader = Reader(INSPECT, 'utf-8', **kwargs)
+    reader.read()
+    out = io.StringIO()
+    Disassembler(out).write_dump(reader.dump)
+    return reader.dump, out.getvalue()
+
+
+def test_listing_follows_instructions():
+    dump, listing = disassemble()
+    blocks = listing.rstrip('\n').split('\n\n')
+    prototypes = dump.sorted_prototypes()
+    assert len(blocks) == len(prototypes)
+
+    for block, pt in zip(blocks, prototypes):
+        header, *lines = block.split('\n')
+        assert header == '-- BYTECODE -- {}:{}-{}'.format(dump.name, pt.first_line_number, pt.first_line_number + pt.line_count)
+        # pc 0 is the function head
+        assert len(lines) == len(pt.instructions) - 1
+        for pc, line in enumerate(lines, 1):
+            ins = pt.instructions[pc]
+            assert line.split()[:3] == ['%04d' % pc, '[%d]' % pt.debug_info.addr_to_line_map[pc], INSTRUCTIONS[ins.OPCODE].NAME]
+            if ins.CD_TYPE == InsType.JMP:
+                assert line.endswith(' => %04d' % (pc + ins.cd + 1))
+            elif ins.CD_TYPE == InsType.STR:
+                ref = pt.constants[ins.cd].ref
+                if ref.isalnum() and len(ref) <= MAX_STRING_LENGTH:
+                    assert line.endswith('  ; "{}"'.format(ref))
+
+
+def test_compact_listing_is_the_same():
+    assert disassemble(compact=True)[1] == disassemble()[1]
+
+
+def test_listing_without_debug_info():
+    dump, listing = disassemble(debug_info=Reader.DEBUG_INFO_SKIP)
+    lines = [line for line in listing.split('\n') if line and not line.startswith('--')]
+    assert len(lines) == sum(len(pt.instructions) - 1 for pt in dump.sorted_prototypes())
+    assert not any(line.split()[1].startswith('[') for line in lines)
@@ -0,0 +1,25 @@
+import io
+import os
+
+import pytest
+
+from bc.formatter import Formatter
+from bc.reader import Reader
+from bc.writer import DumpWriter
+
+INSPECT = os.path.join(os.path.dirname(__file__), 'inspect.luajit')
+
+
+@pytest.mark.parametrize('compact', [False, True])
+def test_write_matches_format(compact):
+    reader = Reader(INSPECT, 'utf-8', compact=compact)
+    reader.read()
+    out = io.StringIO()
+    Formatter(reader.dump, 'utf-8').write(out)
+    assert out.getvalue() == Formatter(reader.dump, 'utf-8').format()
+
+    # the output is python code building the dump again
+    namespace = {}
+    exec(out.getvalue(), namespace)
+    with open(INSPECT, 'rb') as fd:
+        assert DumpWriter(namespace['dump']).write_to_bytes() == fd.read()
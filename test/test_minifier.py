@@ -0,0 +1,81 @@
+import os
+
+import pytest
+
+from bc.minifier import Minifier, NUMERIC_OPCODES
+from bc.reader import Reader
+from bc.writer import DumpWriter
+
+TEST_DIR = os.path.dirname(__file__)
+
+
+def read(name, **kwargs):
+    reader = Reader(os.path.join(TEST_DIR, name), 'utf-8', **kwargs)
+    reader.read()
+    return reader.dump
+
+
+@pytest.mark.parametrize('compact', [False, True])
+def test_minify_verify(compact):
+    dump = read('inspect.luajit', compact=compact)
+    minifier = Minifier(dump)
+    savings = minifier.minify()
+    data = DumpWriter(dump).write_to_bytes()
+    minifier.verify(data)
+
+    assert sum(savings.values()) > 0
+    with open(os.path.join(TEST_DIR, 'inspect.luajit'), 'rb') as fd:
+        assert len(data) < len(fd.read())
+
+
+@pytest.mark.parametrize('compact', [False, True])
+def test_numerics_merged_and_dropped(compact):
+    dump = read('inspect.luajit', compact=compact)
+    pt = next(pt for pt in dump.sorted_prototypes() if pt.numerics)
+    pcs = [pc for pc, ins in enumerate(pt.instructions) if ins.OPCODE in NUMERIC_OPCODES]
+    values = [pt.numerics[pt.instructions[pc].cd] for pc in pcs]
+    numerics = list(pt.numerics)
+    # a duplicate the last reference is moved to, and an unused number in front of everything
+    pt.numerics = [0.5] + numerics + [numerics[pt.instructions[pcs[-1]].cd]]
+    for pc in pcs:
+        ins = pt.instructions[pc]
+        ins.cd = len(pt.numerics) - 1 if pc == pcs[-1] else ins.cd + 1
+        pt.instructions[pc] = ins
+
+    minifier = Minifier(dump)
+    minifier.minify()
+    minifier.verify(DumpWriter(dump).write_to_bytes())
+    assert pt.numerics == numerics
+    assert [pt.numerics[pt.instructions[pc].cd] for pc in pcs] == values
+
+
+def test_savings_of_edited_prototypes():
+    dump = read('inspect.luajit', keep_raw=True)
+    main = dump.sorted_prototypes()[-1]
+    const = next(c for c in main.constants if isinstance(c.ref, str))
+    const.ref += 'x' * 1000
+
+    # measured against the edited prototype, not the body as read
+    savings = Minifier(dump).minify()
+    assert 0 < savings[main.number] < 1000
+
+
+def test_verify_compares_values():
+    dump = read('inspect.luajit')
+    minifier = Minifier(dump)
+    minifier.minify()
+    data = DumpWriter(dump).write_to_bytes()
+
+    main = dump.sorted_prototypes()[-1]
+    const = next(c for c in main.constants if isinstance(c.ref, str))
+    const.ref += '_'
+    with pytest.raises(Exception, match='does not match'):
+        minifier.verify(data)
+
+
+def test_cdata_constants_refused():
+    dump = read('ffi.luajit')
+    with pytest.raises(Exception, match='cdata'):
+        Minifier(dump).minify()
+    assert not dump.is_stripped
+    assert dump.prototypes[0].debug_info is not None
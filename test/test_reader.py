@@ -0,0 +1,140 @@
+import os
+
+import pytest
+
+from bc.data import Const
+from bc.reader import Reader
+from bc.writer import DumpWriter
+
+INSPECT = os.path.join(os.path.dirname(__file__), 'inspect.luajit')
+
+
+def read(**kwargs):
+    reader = Reader(INSPECT, 'utf-8', **kwargs)
+    reader.read()
+    return reader.dump
+
+
+@pytest.mark.parametrize('link_children', [True, False])
+def test_iter_prototypes(link_children):
+    dump = read()
+    writer = DumpWriter(dump)
+    expected = [writer.encode_prototype(pt) for pt in dump.sorted_prototypes()]
+
+    reader = Reader(INSPECT, 'utf-8')
+    encoded = []
+    yielded = []
+    for pt in reader.iter_prototypes(link_children):
+        encoded.append(writer.encode_prototype(pt))
+        for child in pt.child_prototypes():
+            if link_children:
+                assert any(child is other for other in yielded)
+            else:
+                # header only copy
+                assert child.instruction_count and not child.instructions
+        yielded.append(pt)
+    assert encoded == expected
+    assert any(pt.child_prototypes() for pt in yielded)
+    assert reader.dump.prototypes == [] and reader.dump.name == dump.name
+
+
+def test_lazy_index():
+    expected = read().sorted_prototypes()  # file order
+    writer = DumpWriter(read())
+    reader = Reader(INSPECT, 'utf-8', lazy=True)
+    reader.read()
+    try:
+        index = reader.index
+        assert [pt.number for pt in index] == [pt.number for pt in expected]
+        assert reader.dump.prototypes == [pt for pt in index if pt.parent is None] == [index[-1]]
+        for pt, full in zip(index, expected):
+            assert not pt.is_loaded
+            assert pt.size == len(writer.encode_prototype(full))
+            assert (pt.has_sub_prototypes, pt.is_variadic, pt.has_ffi, pt.is_jit_disabled, pt.has_iloop) == \
+                   (full.has_sub_prototypes, full.is_variadic, full.has_ffi, full.is_jit_disabled, full.has_iloop)
+            assert (pt.argument_count, pt.frame_size, pt.instruction_count, pt.constant_count) == \
+                   (full.argument_count, full.frame_size, full.instruction_count, full.constant_count)
+            assert [c.number for c in pt.child_prototypes()] == [c.number for c in full.child_prototypes()]
+            assert all(child.parent is pt for child in pt.children)
+
+            # offset is where the instructions after the head start
+            reader.stream.seek(pt.offset)
+            codewords = reader.stream.read_uint_array(pt.instruction_count)
+            assert [w & 0xff for w in codewords] == [ins.OPCODE for ins in full.instructions[1:]]
+        assert not any(pt.is_loaded for pt in index)
+
+        # the header fields do not load the body, the first body field does
+        pt = index[0]
+        assert pt.number == 0 and pt.frame_size == expected[0].frame_size and not pt.is_loaded
+        assert len(pt.instructions) == len(expected[0].instructions) and pt.is_loaded
+        assert not index[1].is_loaded
+    finally:
+        reader.close()
+
+
+def debug_info_fields(debug_info):
+    return (list(debug_info.addr_to_line_map), debug_info.upvalue_variable_names,
+            [(v.start_addr, v.end_addr, v.type, v.name) for v in debug_info.variable_infos])
+
+
+def test_lazy_debug_info():
+    with open(INSPECT, 'rb') as fd:
+        data = fd.read()
+    expected = read().sorted_prototypes()
+    dump = read(debug_info=Reader.DEBUG_INFO_LAZY)
+    lazy = [pt.debug_info for pt in dump.sorted_prototypes() if pt.debug_info is not None]
+    assert lazy and not any(debug_info.is_loaded for debug_info in lazy)
+
+    for pt, full in zip(dump.sorted_prototypes(), expected):
+        if full.debug_info is None:
+            assert pt.debug_info is None
+        else:
+            assert debug_info_fields(pt.debug_info) == debug_info_fields(full.debug_info)
+            assert pt.debug_info.is_loaded
+    assert DumpWriter(dump).write_to_bytes() == data
+
+
+def test_skipped_debug_info():
+    full = read()
+    dump = read(debug_info=Reader.DEBUG_INFO_SKIP)
+    assert any(pt.debug_info_size for pt in dump.sorted_prototypes())
+    assert all(pt.debug_info is None for pt in dump.sorted_prototypes())
+
+    # the rest of the prototypes is read as usual
+    full.is_stripped = dump.is_stripped = Const.FLAG_IS_STRIPPED
+    assert DumpWriter(dump).write_to_bytes() == DumpWriter(full).write_to_bytes()
+
+
+@pytest.mark.parametrize('name', ['inspect.luajit', 'ffi.luajit'])
+def test_probe(name):
+    filename = os.path.join(os.path.dirname(__file__), name)
+    reader = Reader(filename, 'utf-8')
+    reader.read()
+    dump = reader.dump
+
+    summary = Reader(filename, 'utf-8').probe()
+    assert (summary.name, summary.version, summary.has_ffi, summary.is_stripped) == (dump.name, dump.version, bool(dump.has_ffi), bool(dump.is_stripped))
+    assert summary.size == os.path.getsize(filename) and summary.prototype_count is None
+
+    summary = Reader(filename, 'utf-8').probe(count_prototypes=True)
+    assert summary.prototype_count == len(dump.sorted_prototypes())
+    assert summary.instruction_count == sum(pt.instruction_count for pt in dump.sorted_prototypes())
+
+
+def test_probe_refuses_other_files():
+    with pytest.raises(Exception, match='magic'):
+        Reader(os.path.join(os.path.dirname(__file__), 'inspect.lua'), 'utf-8').probe()
+
+
+@pytest.mark.parametrize('compact', [False, True])
+def test_unknown_opcodes_are_named(compact):
+    reader = Reader(INSPECT, 'utf-8', lazy=True)
+    reader.read()
+    first = reader.index[0]
+    reader.close()
+    with open(INSPECT, 'rb') as fd:
+        data = bytearray(fd.read())
+    data[first.offset] = 0xf0
+
+    with pytest.raises(ValueError, match='prototype 0: f0$'):
+        Reader(bytes(data), 'utf-8', compact=compact).read()
@@ -0,0 +1,37 @@
+import io
+import os
+import struct
+
+import pytest
+
+from bc import snapshot
+from bc.reader import Reader
+from bc.writer import DumpWriter
+
+INSPECT = os.path.join(os.path.dirname(__file__), 'inspect.luajit')
+
+
+@pytest.mark.parametrize('options', [{}, {'compact': True}, {'lazy': True, 'debug_info': 'lazy'}])
+def test_save_load_write(options):
+    with open(INSPECT, 'rb') as fd:
+        data = fd.read()
+    reader = Reader(INSPECT, 'utf-8', **options)
+    reader.read()
+    out = io.BytesIO()
+    snapshot.save(reader.dump, out)
+    out.seek(0)
+    dump = snapshot.load(out)
+    assert DumpWriter(dump).write_to_bytes() == data
+
+
+def test_corrupt_snapshot_refused():
+    reader = Reader(INSPECT, 'utf-8')
+    reader.read()
+    data = snapshot.to_bytes(reader.dump)
+
+    with pytest.raises(Exception, match='checksum'):
+        snapshot.from_bytes(data[:-1])
+    with pytest.raises(Exception, match='not supported'):
+        snapshot.from_bytes(data[:4] + struct.pack('<H', 1) + data[6:])
+    with pytest.raises(Exception, match='not supported'):
+        snapshot.from_bytes(data[:6] + struct.pack('<I', snapshot.LAYOUT ^ 1) + data[10:])
@@ -0,0 +1,95 @@
+import io
+import math
+import os
+
+import pytest
+
+from bc.reader import Reader
+from bc.stream import MemoryStream, Stream, BufferStream, decode_uleb128, decode_uleb128_33
+from bc.writer import DumpWriter
+
+INSPECT = os.path.join(os.path.dirname(__file__), 'inspect.luajit')
+
+
+def inspect_bytes():
+    with open(INSPECT, 'rb') as fd:
+        return fd.read()
+
+
+@pytest.mark.parametrize('source', ['path', 'bytes', 'bytearray', 'memoryview', 'BytesIO'])
+def test_memory_stream_round_trip(source):
+    data = inspect_bytes()
+    filename = {'path': INSPECT, 'bytes': data, 'bytearray': bytearray(data), 'memoryview': memoryview(data), 'BytesIO': io.BytesIO(data)}[source]
+    reader = Reader(filename, 'utf-8')
+    reader.read()
+    assert DumpWriter(reader.dump).write_to_bytes() == data
+
+
+def test_memory_stream_maps_files():
+    stream = MemoryStream.open(INSPECT)
+    assert stream.mmap is not None and stream.read_bytes(3) == inspect_bytes()[:3]
+    stream.close()
+    assert stream.mmap is None and stream.buffer is None
+
+
+def test_file_stream_round_trip():
+    reader = Reader(INSPECT, 'utf-8', in_memory=False)
+    reader.read()
+    assert DumpWriter(reader.dump).write_to_bytes() == inspect_bytes()
+
+
+@pytest.mark.parametrize('wrap', [bytes, memoryview])
+def test_read_zstring(wrap):
+    stream = MemoryStream.open(wrap(b'abc\x00\x00xyz\x00'))
+    assert stream.read_zstring() == b'abc'
+    assert stream.read_zstring() == b''
+    assert stream.read_zstring() == b'xyz'
+    assert stream.tell() == 9
+
+
+def test_read_zstring_unterminated():
+    stream = MemoryStream.open(b'abc')
+    with pytest.raises(EOFError):
+        stream.read_zstring()
+
+
+UNSIGNED = [0, 1, 0x7f, 0x80, 0x3fff, 0x4000, 0xffffffff, 0x1fffffffff]
+NUMERICS = [0, 1, -1, 0x7fffffff, -0x80000000, 0.5, -0.0, 1e300, -2.5e-300, math.inf]
+
+
+def test_decode_uleb128():
+    out = BufferStream()
+    for value in UNSIGNED:
+        out.write_uleb128(value)
+    data = b'\xff' + out.getvalue()
+    stream = Stream.open(io.BytesIO(data))
+    stream.skip(1)
+
+    values, pos = decode_uleb128(memoryview(data), 1, len(UNSIGNED))
+    assert values == [stream.read_uleb128() for _ in UNSIGNED] == UNSIGNED
+    assert pos == len(data)
+
+
+def test_decode_uleb128_33():
+    out = BufferStream()
+    for value in NUMERICS:
+        out.write_uleb128_33(value)
+    data = out.getvalue()
+    stream = Stream.open(io.BytesIO(data))
+
+    values, pos = decode_uleb128_33(memoryview(data), 0, len(NUMERICS))
+    expected = [stream.read_uleb128_33() for _ in NUMERICS]
+    assert values == expected == NUMERICS
+    assert [type(v) for v in values] == [type(v) for v in NUMERICS]
+    assert math.copysign(1, values[6]) < 0  # -0.0
+    assert pos == len(data)
+
+
+def test_numerics_match_file_stream():
+    memory = Reader(INSPECT, 'utf-8')
+    memory.read()
+    file = Reader(INSPECT, 'utf-8', in_memory=False)
+    file.read()
+    for pt, expected in zip(memory.dump.sorted_prototypes(), file.dump.sorted_prototypes()):
+        assert pt.numerics == expected.numerics
+        assert [c.ref for c in pt.constants if isinstance(c.ref, str)] == [c.ref for c in expected.constants if isinstance(c.ref, str)]
@@ -0,0 +1,106 @@
+import os
+
+import pytest
+
+from bc.data import Table, ConstRef, Const, InstructionArray
+from bc.reader import Reader
+from bc.writer import DumpWriter
+
+INSPECT = os.path.join(os.path.dirname(__file__), 'inspect.luajit')
+
+
+def read(**kwargs):
+    reader = Reader(INSPECT, 'utf-8', keep_raw=True, **kwargs)
+    reader.read()
+    return reader.dump
+
+
+def set_frame_size(pt):
+    pt.frame_size += 1
+
+
+def patch_instruction(pt):
+    ins = pt.instructions[1]
+    ins.a += 1
+    pt.instructions[1] = ins
+
+
+def patch_operand(pt):
+    if isinstance(pt.instructions, InstructionArray):
+        pt.instructions.a[1] += 1
+    else:
+        pt.instructions[1].a += 1
+
+
+def patch_upvalue(pt):
+    pt.upvalues.append(0)
+
+
+def replace_constant(pt):
+    index = next(i for i, c in enumerate(pt.constants) if isinstance(c.ref, str))
+    pt.constants[index] = ConstRef(pt.constants[index].ref + '_')
+
+
+def append_numeric(pt):
+    pt.numerics.append(0.5)
+
+
+def patch_string(pt):
+    const = next(c for c in pt.constants if isinstance(c.ref, str))
+    const.ref += '_'
+
+
+def patch_table(pt):
+    table = next(c.ref for c in pt.constants if isinstance(c.ref, Table))
+    table.array.append(1)
+    pt.mark_dirty()
+
+
+@pytest.mark.parametrize('lazy', [False, True])
+@pytest.mark.parametrize('compact', [False, True])
+def test_unchanged_is_copied(lazy, compact):
+    with open(INSPECT, 'rb') as fd:
+        data = fd.read()
+    dump = read(lazy=lazy, compact=compact)
+    assert not any(pt.is_dirty for pt in dump.sorted_prototypes())
+    assert DumpWriter(dump).write_to_bytes() == data
+
+
+@pytest.mark.parametrize('lazy', [False, True])
+@pytest.mark.parametrize('compact', [False, True])
+@pytest.mark.parametrize('edit', [set_frame_size, patch_instruction, patch_operand, patch_upvalue, replace_constant, append_numeric, patch_string, patch_table])
+def test_edit_is_encoded(lazy, compact, edit):
+    dump = read(lazy=lazy, compact=compact)
+    pt = dump.sorted_prototypes()[-1]  # the main chunk has strings and tables
+    edit(pt)
+    assert pt.is_dirty
+
+    edited = Reader(DumpWriter(dump).write_to_bytes(), 'utf-8')
+    edited.read()
+    expected = DumpWriter(dump)
+    expected_pt = expected.encode_prototype(pt)
+    assert DumpWriter(edited.dump).encode_prototype(edited.dump.sorted_prototypes()[-1]) == expected_pt
+    assert expected_pt != pt.raw
+
+
+def test_loading_is_not_a_change():
+    dump = read(lazy=True, debug_info=Reader.DEBUG_INFO_LAZY)
+    for pt in dump.sorted_prototypes():
+        pt.load()
+        if pt.debug_info is not None:
+            pt.debug_info.load()
+    assert not any(pt.is_dirty for pt in dump.sorted_prototypes())
+
+
+@pytest.mark.parametrize('lazy', [False, True])
+@pytest.mark.parametrize('flag, value', [('is_big_endian', Const.FLAG_IS_BIG_ENDIAN), ('is_stripped', Const.FLAG_IS_STRIPPED)])
+def test_layout_change_is_encoded(lazy, flag, value):
+    dump = read(lazy=lazy)
+    setattr(dump, flag, value)
+    data = DumpWriter(dump).write_to_bytes()
+
+    reader = Reader(INSPECT, 'utf-8')
+    reader.read()
+    setattr(reader.dump, flag, value)
+    assert data == DumpWriter(reader.dump).write_to_bytes()
+    Reader(data, 'utf-8').read()
@@ -0,0 +1,21 @@
+local function unreduced(a, b, y, t)
+  while not y do
+    if a == 1 and not y then
+      for k, v in pairs(t) do
+        a = a + 1
+      end
+    end
+  end
+  if a < b then
+  else
+    repeat
+    until b ~= nil
+  end
+  y = t.k
+end
+local function fine(n)
+  local s = 0
+  for i = 1, n do s = s + i end
+  return s
+end
+return unreduced, fine